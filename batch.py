@@ -0,0 +1,221 @@
+# Batches of small images realized together.
+
+# tutorial10_convolutionSchedule.boxBlur and harris.computeHarris build, compile and
+# realize a pipeline for every image. On crops of a few thousand pixels the Python
+# setup and compile_jit take much longer than the realize itself. Here a whole list of
+# images goes through a single pipeline, compiled once:
+#   - batchedBoxBlur works on a 4D buffer [x, y, c, n] (see pack) and runs in parallel
+#     over the images n, or over the tiles of all the images.
+#   - batchedHarris folds n into y: the images are stacked vertically with gap rows
+#     between them (see stack) and boundary.Stacked repeats the edges of each image,
+#     so the 2D Harris pipeline of harrisStages is used unchanged, one tile per image.
+# Images of a batch can have different sizes: each one is clamped to its own width
+# and height, read from a small Image of sizes.
+#
+#   python batch.py             256 crops of 32 to 96 pixels
+#   python batch.py 1000        1000 crops
+
+import os, sys
+from halide import *
+import time
+import numpy
+import synthetic
+
+import boundary
+import harris
+import reference
+import tutorial10_convolutionSchedule
+
+def asChannels(im):
+    '''im as a float32 [y, x, c] array, with one channel if it had none'''
+    im=numpy.asarray(im, numpy.float32)
+    if im.ndim==2: im=im[:, :, numpy.newaxis]
+    return im
+
+def sizesOf(images):
+    '''(n, 2) int32 array of the (width, height) of the images.
+    It shows up as sizes[0, n] (width) and sizes[1, n] (height) in Halide'''
+    return numpy.array([(im.shape[1], im.shape[0]) for im in images], numpy.int32)
+
+def pack(images):
+    '''one float32 numpy array [y, x, c, n], seen as [x, y, c, n] by Halide, holding the
+    images [y, x(, c)] of the list, all with the same number of channels.
+    Images smaller than the largest one are padded with zeros, which are never read.
+    Returns the batch and the sizes of the images (see sizesOf)'''
+    images=[asChannels(im) for im in images]
+    sizes=sizesOf(images)
+    channels=images[0].shape[2]
+    batch=numpy.zeros((sizes[:, 1].max(), sizes[:, 0].max(), channels, len(images)), numpy.float32)
+    for n, im in enumerate(images):
+        batch[:im.shape[0], :im.shape[1], :, n]=im
+    return batch, sizes
+
+def unpack(output, sizes):
+    '''list of the images cropped out of a realized batch [y, x, c, n]'''
+    return [output[:h, :w, :, n] for n, (w, h) in enumerate(sizes)]
+
+def stack(images, gap):
+    '''one float32 numpy array [y, x, c] with the images one above the other, each with
+    gap rows above and below it, as described by boundary.Stacked.
+    Returns the stack, the sizes of the images and the stride between two images'''
+    images=[asChannels(im) for im in images]
+    sizes=sizesOf(images)
+    stride=sizes[:, 1].max()+2*gap
+    out=numpy.zeros((stride*len(images), sizes[:, 0].max(), images[0].shape[2]), numpy.float32)
+    for n, im in enumerate(images):
+        top=n*stride+gap
+        out[top:top+im.shape[0], :im.shape[1]]=im
+    return out, sizes, stride
+
+def unstack(output, sizes, gap, stride):
+    '''list of the images cropped out of a realized stack [y, x(, c)]'''
+    return [output[n*stride+gap:n*stride+gap+h, :w] for n, (w, h) in enumerate(sizes)]
+
+def batchedBoxBlur(images, indexOfSchedule=0, tileX=32, tileY=32, kernel_width=5):
+    '''tutorial10_convolutionSchedule.boxBlur of every image of the list in one realize.
+    Schedule 0 runs in parallel over the images and computes the horizontal pass of an
+    image at once. Schedule 1 tiles every image and runs in parallel over the tiles
+    of all the images. Returns the list of numpy outputs and the time of the realize'''
+    batch, sizes = pack(images)
+    input = Image(Float(32), batch)
+    dims = Image(Int(32), sizes)
+
+    x, y, c, n = Var('x'), Var('y'), Var('c'), Var('n')
+    width, height = dims[0, n], dims[1, n]
+    # the sizes are loaded at run time and cannot bound the accesses:
+    # clamp to the image, then to the batch for bounds inference
+    maxWidth, maxHeight = batch.shape[1], batch.shape[0]
+    def clampX(v): return clamp(clamp(v, 0, width-1), 0, maxWidth-1)
+    def clampY(v): return clamp(clamp(v, 0, height-1), 0, maxHeight-1)
+
+    clamped = Func('clamped')
+    clamped[x, y, c, n] = input[clampX(x), clampY(y), c, n]
+
+    rx = RDom(0, kernel_width, 'rx')
+    blur_x = Func('blur_x')
+    blur_x[x,y,c,n] = 0.0
+    blur_x[x,y,c,n] += clamped[x+rx.x-kernel_width/2, y, c, n]
+
+    clampedBlurx = Func('clampedBlurx')
+    clampedBlurx[x, y, c, n] = blur_x[clampX(x), clampY(y), c, n]
+
+    ry = RDom(0, kernel_width, 'ry')
+    blur_y = Func('blur_y')
+    blur_y[x,y,c,n] = 0.0
+    blur_y[x,y,c,n] += clampedBlurx[x, y+ry.x-kernel_width/2, c, n]
+
+    blur = Func('blur')
+    blur[x,y,c,n] = blur_y[x,y,c,n]/(kernel_width**2)
+
+    vectorWidth=8
+    if indexOfSchedule==0:
+        print '\n', len(images), 'images, parallel over the images'
+        blur.parallel(n).vectorize(x, vectorWidth)
+        clampedBlurx.compute_at(blur, n).vectorize(x, vectorWidth)
+
+    if indexOfSchedule==1:
+        print '\n', len(images), 'images, tile ', tileX, 'x', tileY, ' parallel over the tiles of all images'
+        xi, yi, xo, yo, yn = Var('xi'), Var('yi'), Var('xo'), Var('yo'), Var('yn')
+        blur.tile(x, y, xo, yo, xi, yi, tileX, tileY).reorder(xi, yi, xo, c, yo, n)
+        blur.fuse(yo, n, yn).parallel(yn).vectorize(xi, vectorWidth)
+        clampedBlurx.compute_at(blur, xo).vectorize(x, vectorWidth)
+
+    blur.compile_jit()
+    t=time.time()
+    output = blur.realize(batch.shape[1], batch.shape[0], batch.shape[2], batch.shape[3])
+    dt=time.time()-t
+    print '           took ', dt, 'seconds'
+    return unpack(numpy.array(Image(output)), sizes), dt
+
+def harrisGap(sigma=0.5, fusedTensor=True):
+    '''largest stencil radius of the Harris pipeline: the rows needed between two
+    stacked images so that no clamped access reaches the next one'''
+    gap=0
+    for name, consumers, ops, channels, placements in harris.harrisStageGraph(sigma, fusedTensor=fusedTensor):
+        for rx, ry in consumers.itervalues():
+            if rx>gap: gap=rx
+            if ry>gap: gap=ry
+    return gap
+
+def batchedHarris(images, tileX=256, sigma=0.5, fusedTensor=True):
+    '''harris.computeHarris (schedule 1) of every RGB image of the list in one realize,
+    the images being stacked along y with harrisGap rows between them. Each tile is one
+    image (or tileX columns of it) and the tiles run in parallel.
+    Returns the list of numpy masks and the time of the realize'''
+    if 4.0*sigma>=harris.iirSigma:
+        # the recursive blurs scan whole columns, across the images
+        raise ValueError('batchedHarris needs the FIR blurs, sigma must be below %g' % (harris.iirSigma/4.0))
+    k = 0.04
+    threshold=0.0
+    gap=harrisGap(sigma, fusedTensor)
+    stacked, sizes, stride = stack(images, gap)
+    input = Image(Float(32), stacked)
+    ref = boundary.Stacked(stacked.shape[1], stride-2*gap, Image(Int(32), sizes), gap)
+
+    output, stages = harris.harrisStages(input, sigma, k, threshold, fusedTensor, ref)
+    placement=dict((name, 'x') for name in stages if name not in ['lumi', 'blurredLumiXX'])
+    # a tile cannot be wider than the stack
+    if tileX>stacked.shape[1]: tileX=stacked.shape[1]
+    harris.applyPlacement(output, stages, placement, stride, tileX)
+    output.parallel(Var('y'))
+    print '\n', len(images), 'images stacked with ', gap, 'rows between them, one tile per image'
+
+    output.compile_jit()
+    t=time.time()
+    result = output.realize(stacked.shape[1], stacked.shape[0])
+    dt=time.time()-t
+    print '           took ', dt, 'seconds'
+    return unstack(numpy.array(Image(result)), sizes, gap, stride), dt
+
+def crops(count, smallest=32, largest=96, seed=0):
+    '''count RGB crops of random sizes cut out of a synthetic image'''
+    source=numpy.array(synthetic.image('pink', 1024, 1024))
+    rng=numpy.random.RandomState(seed)
+    L=[]
+    for i in xrange(count):
+        w, h = rng.randint(smallest, largest+1, 2)
+        x0, y0 = rng.randint(0, 1024-w), rng.randint(0, 1024-h)
+        L.append(source[y0:y0+h, x0:x0+w].copy())
+    return L
+
+def perImage(images):
+    '''time per image of the one image per realize versions, with their setup and compile.
+    boxBlur realizes 5 times, only one of them is counted'''
+    box, corners = 0.0, 0.0
+    for im in images:
+        t=time.time()
+        output, dt = tutorial10_convolutionSchedule.boxBlur(im, 0)
+        box+=time.time()-t-dt*4/5
+        t=time.time()
+        harris.computeHarris(im, 1, 32)
+        corners+=time.time()-t
+    return box/len(images), corners/len(images)
+
+def main():
+    count=int(sys.argv[1]) if len(sys.argv)>1 else 256
+    images=crops(count)
+
+    boxPerImage, harrisPerImage = perImage(images[:16])
+
+    results=[]
+    for i in xrange(2):
+        t=time.time()
+        outputs, dt = batchedBoxBlur(images, i)
+        total=time.time()-t
+        error=numpy.max([numpy.max(numpy.abs(o-reference.boxBlur(im))) for o, im in zip(outputs, images)])
+        results.append(('boxBlur %d' % i, boxPerImage, total/count, dt/count, error))
+
+    t=time.time()
+    outputs, dt = batchedHarris(images)
+    total=time.time()-t
+    wrong=numpy.mean([numpy.mean(o!=reference.harris(im)) for o, im in zip(outputs, images)])
+    results.append(('harris', harrisPerImage, total/count, dt/count, wrong))
+
+    print '\n', count, 'images, seconds per image'
+    print '%-10s %12s %12s %12s %10s' % ('pipeline', 'one by one', 'batched', 'realize', 'error')
+    for name, single, batched, realize, error in results:
+        print '%-10s %12.6f %12.6f %12.6f %10.3g' % (name, single, batched, realize, error)
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# Boundary conditions, and realization split between the interior and the borders.
+
+# Clamping every access of a stencil (as harris.clampIt and the 'clamped' Funcs of
+# the tutorials do) costs a min and a max per coordinate in the innermost loop, even
+# though almost all the pixels of an image are far from its borders.
+# realizeSplit compiles each pipeline with no boundary condition at all, realized only
+# on the interior where no access can leave the image, and with the boundary
+# conditions, realized only on the four border strips (once for the top and bottom
+# strips, once for the left and right ones, as their tiles differ).
+
+import os, sys
+from halide import *
+import time
+import numpy
+
+def repeat_edge(input, width, height, channels=False, name='clamped'):
+    '''pixels outside the image take the value of the closest pixel on the edge'''
+    x, y, c = Var('x'), Var('y'), Var('c')
+    extra = (c,) if channels else ()
+    f = Func(name)
+    f[(x, y)+extra] = input[(clamp(x, 0, width-1), clamp(y, 0, height-1))+extra]
+    return f
+
+def mirror(input, width, height, channels=False, name='mirrored'):
+    '''the image is reflected about its edges, the edge pixels being repeated:
+    x=-1 reads x=0, x=-2 reads x=1, x=width reads width-1'''
+    x, y, c = Var('x'), Var('y'), Var('c')
+    extra = (c,) if channels else ()
+    def reflect(v, n):
+        v = select(v<0, -v-1, v)
+        v = select(v>=n, 2*n-1-v, v)
+        # further than one image away, fall back to the edge
+        return clamp(v, 0, n-1)
+    f = Func(name)
+    f[(x, y)+extra] = input[(reflect(x, width), reflect(y, height))+extra]
+    return f
+
+def constant(input, width, height, value=0.0, channels=False, name='constantExterior'):
+    '''pixels outside the image are equal to value'''
+    x, y, c = Var('x'), Var('y'), Var('c')
+    extra = (c,) if channels else ()
+    f = Func(name)
+    inside = select(x<0, False, select(x>=width, False, select(y<0, False, y<height)))
+    f[(x, y)+extra] = select(inside,
+                             input[(clamp(x, 0, width-1), clamp(y, 0, height-1))+extra],
+                             value)
+    return f
+
+conditions={'repeat_edge':repeat_edge, 'mirror':mirror}
+
+class Interior:
+    '''stands for the reference image of a pipeline that is only realized on pixels
+    whose accesses never leave the image. bounded then adds no boundary condition'''
+    def __init__(self, width, height):
+        self.w, self.h = width, height
+    def width(self): return self.w
+    def height(self): return self.h
+
+class Stacked:
+    '''stands for the reference image of a batch of images stacked along y (see batch.stack).
+    Image n occupies the rows n*stride+gap to n*stride+gap+height_n-1 and the first
+    width_n columns, with gap rows between two images. sizes is the Halide Image of the
+    (width, height) of every image. bounded then repeats the edges of the image a pixel
+    belongs to, which is right for stencils of radius at most gap'''
+    def __init__(self, width, height, sizes, gap):
+        self.w, self.h = width, height
+        self.sizes, self.gap = sizes, gap
+        self.count = sizes.height()
+        self.stride = height+2*gap
+    def width(self): return self.w
+    def height(self): return self.stride*self.count
+
+def stackedEdge(input, stacked, channels=False, name='clamped'):
+    '''repeat_edge within each image of a Stacked batch'''
+    x, y, c = Var('x'), Var('y'), Var('c')
+    extra = (c,) if channels else ()
+    n = clamp(y/stacked.stride, 0, stacked.count-1)
+    top = n*stacked.stride+stacked.gap
+    width, height = stacked.sizes[0, n], stacked.sizes[1, n]
+    f = Func(name)
+    # the sizes are loaded at run time and cannot bound the accesses:
+    # clamp to the image, then to the stack for bounds inference
+    f[(x, y)+extra] = input[(clamp(clamp(x, 0, width-1), 0, stacked.width()-1),
+                             clamp(clamp(y, top, top+height-1), 0, stacked.height()-1))+extra]
+    return f
+
+def bounded(input, refImage, condition='repeat_edge', channels=False, name='clamped', value=0.0):
+    '''input with the given boundary condition ('repeat_edge', 'mirror' or 'constant')
+    outside the bounds of refImage, or unchanged if refImage is an Interior.
+    For a Stacked refImage the edges of each image are repeated, whatever the condition'''
+    if isinstance(refImage, Interior):
+        x, y, c = Var('x'), Var('y'), Var('c')
+        extra = (c,) if channels else ()
+        f = Func(name)
+        f[(x, y)+extra] = input[(x, y)+extra]
+        return f
+    if isinstance(refImage, Stacked):
+        # only the edges are repeated between the images of a batch
+        return stackedEdge(input, refImage, channels, name)
+    if condition=='constant':
+        return constant(input, refImage.width(), refImage.height(), value, channels, name)
+    return conditions[condition](input, refImage.width(), refImage.height(), channels, name)
+
+def shifted(f, ox, oy, channels=False):
+    '''f translated by (ox, oy) so that a realization starting at 0, 0 covers
+    a region starting at ox, oy'''
+    x, y, c = Var('x'), Var('y'), Var('c')
+    extra = (c,) if channels else ()
+    g = Func('shifted')
+    g[(x, y)+extra] = f[(x+ox, y+oy)+extra]
+    return g
+
+def borderStrips(width, height, radius):
+    '''(x, y, width, height) of the top, bottom, left and right strips of the image
+    that are within radius of an edge'''
+    return [(0, 0, width, radius), (0, height-radius, width, radius),
+            (0, radius, radius, height-2*radius), (width-radius, radius, radius, height-2*radius)]
+
+def realizeClamped(build, width, height, refImage, channels=None):
+    '''realize a pipeline built as for realizeSplit with the boundary conditions
+    everywhere. Returns the numpy output (y, x[, c]) and the time of the realization'''
+    extra = () if channels is None else (channels,)
+    output, schedule = build(refImage)
+    output = shifted(output, 0, 0, channels is not None)
+    if schedule is not None: schedule(output, width, height)
+    output.compile_jit()
+    t=time.time()
+    result = output.realize(*((width, height)+extra))
+    dt = time.time()-t
+    return numpy.array(Image(result)), dt
+
+def realizeSplit(build, width, height, radius, refImage, channels=None):
+    '''realize a pipeline separately on its interior and on its borders.
+    build(ref) returns (output, schedule) where output is the output Func of the
+    pipeline, built with bounded(..., ref) for every boundary condition, and schedule
+    is None or a function schedule(f, width, height) that schedules the pipeline given
+    the Func that gets realized and the size of the realization. The border strips are
+    only radius pixels wide or tall: schedule must not split f by more than that.
+    radius is the distance outside the image that the pipeline can reach from an
+    output pixel. Returns the numpy output (y, x[, c]) and the time of the realizations'''
+    extra = () if channels is None else (channels,)
+    out = numpy.empty((height, width)+extra, numpy.float32)
+    dt = 0.0
+
+    if width<=2*radius or height<=2*radius:
+        # no interior
+        return realizeClamped(build, width, height, refImage, channels)
+
+    # interior, no boundary condition
+    output, schedule = build(Interior(width, height))
+    interior = shifted(output, radius, radius, channels is not None)
+    if schedule is not None: schedule(interior, width-2*radius, height-2*radius)
+    interior.compile_jit()
+    t=time.time()
+    result = interior.realize(*((width-2*radius, height-2*radius)+extra))
+    dt += time.time()-t
+    out[radius:height-radius, radius:width-radius] = numpy.array(Image(result))
+
+    # borders, compiled once for the top and bottom strips and once for the left and
+    # right ones, each scheduled for the size of its strips
+    ox, oy = Param(Int(32), 'ox'), Param(Int(32), 'oy')
+    borders = {}
+    for x, y, w, h in borderStrips(width, height, radius):
+        if (w, h) not in borders:
+            output, schedule = build(refImage)
+            border = shifted(output, ox, oy, channels is not None)
+            if schedule is not None: schedule(border, w, h)
+            border.compile_jit()
+            borders[(w, h)] = border
+        border = borders[(w, h)]
+        ox.set(x)
+        oy.set(y)
+        t=time.time()
+        result = border.realize(*((w, h)+extra))
+        dt += time.time()-t
+        out[y:y+h, x:x+w] = numpy.array(Image(result))
+
+    return out, dt
@@ -0,0 +1,152 @@
+# Trace-driven simulation of a set-associative cache hierarchy.
+
+# The evaluation orders of tutorial6 (lists of ('blur_x', x, y) triplets) and the traces
+# of scheduleSimulator say in which order values are computed, not what that order does
+# to the caches. Here the memory accesses of a trace are replayed through L1, L2 and
+# last level caches with LRU replacement, sized from /sys/devices/system/cpu by default,
+# and the misses are counted for every stage at every level. Each level only sees the
+# misses of the level above; stores allocate lines like loads.
+# This explains why ROOT loses to TILING once the intermediate no longer fits in a cache,
+# and which tile sizes keep the tile of the intermediate in L1 or L2.
+
+import os, sys
+import glob
+import numpy
+
+import scheduleSimulator
+
+class Level:
+    def __init__(self, name, size, ways, line=64):
+        self.name, self.size, self.ways, self.line = name, size, ways, line
+        self.sets=max(1, size/(ways*line))
+
+    def __repr__(self):
+        return '%s: %d KB, %d-way, %d B lines' % (self.name, self.size/1024, self.ways, self.line)
+
+# used when /sys does not describe the caches
+defaultLevels=[Level('L1', 32*1024, 8), Level('L2', 256*1024, 8), Level('LLC', 8*1024*1024, 16)]
+
+def parseSize(text):
+    '''"32K" or "8192K" in bytes'''
+    text=text.strip()
+    units={'K':1024, 'M':1024**2, 'G':1024**3}
+    if text[-1] in units: return int(text[:-1])*units[text[-1]]
+    return int(text)
+
+def hostLevels(cpu='/sys/devices/system/cpu/cpu0/cache'):
+    '''data and unified caches of the host from sysfs, smallest first'''
+    levels=[]
+    for d in sorted(glob.glob(os.path.join(cpu, 'index*'))):
+        def read(name):
+            f=open(os.path.join(d, name))
+            value=f.read().strip()
+            f.close()
+            return value
+        try:
+            if read('type')=='Instruction': continue
+            levels.append((int(read('level')), parseSize(read('size')),
+                           int(read('ways_of_associativity')), int(read('coherency_line_size'))))
+        except (IOError, ValueError):
+            continue
+    if not levels: return defaultLevels
+    levels.sort()
+    names=['L%d' % l for l, s, w, n in levels]
+    names[-1]='LLC' if len(levels)>2 else names[-1]
+    return [Level(name, s, w, n) for name, (l, s, w, n) in zip(names, levels)]
+
+def replay(lines, level):
+    '''LRU replay of a sequence of line numbers through one level.
+    Returns a boolean array, True for the accesses that miss'''
+    sets=[[] for i in xrange(level.sets)]
+    nSets, ways = level.sets, level.ways
+    miss=numpy.zeros(len(lines), bool)
+    for i, l in enumerate(lines.tolist()):
+        s=sets[l%nSets]
+        if l in s:
+            if s[-1]!=l:
+                s.remove(l)
+                s.append(l)
+        else:
+            miss[i]=True
+            if len(s)==ways: del s[0]
+            s.append(l)
+    return miss
+
+def simulate(stage, address, levels=None):
+    '''replay the byte addresses (with the stage of each access) through the levels.
+    Returns a list of (level, accesses per stage, misses per stage), where the per
+    stage counts are arrays indexed by stage'''
+    if levels is None: levels=hostLevels()
+    nStages=int(stage.max())+1
+    lines=address/levels[0].line
+    # an access to the line just accessed always hits the first level: only the
+    # others need to be replayed
+    first=numpy.ones(len(lines), bool)
+    first[1:]=lines[1:]!=lines[:-1]
+    accesses=numpy.bincount(stage, minlength=nStages)
+    address, stage = address[first], stage[first]
+    results=[]
+    for level in levels:
+        # line indices from the byte addresses, for the line size of each level
+        miss=replay(address/level.line, level)
+        misses=numpy.bincount(stage[miss], minlength=nStages)
+        results.append((level, accesses, misses))
+        # the next level sees the misses only
+        accesses=misses
+        address, stage = address[miss], stage[miss]
+    return results
+
+def simulateTrace(trace, levels=None):
+    '''simulate the memory accesses of a scheduleSimulator.Trace'''
+    memory=trace.op!=scheduleSimulator.INLINE
+    return simulate(trace.stage[memory].astype(numpy.intp), trace.address[memory], levels)
+
+def simulateTuples(L, width, levels=None):
+    '''simulate an evaluation order [(name, x, y), ...] as built in tutorial6, each
+    evaluation being a store to a width-wide buffer of floats per name'''
+    names=sorted(set(name for name, x, y in L))
+    index=dict((n, i) for i, n in enumerate(names))
+    stage=numpy.array([index[name] for name, x, y in L], numpy.intp)
+    xs=numpy.array([x for name, x, y in L], numpy.int64)
+    ys=numpy.array([y for name, x, y in L], numpy.int64)
+    address=(stage.astype(numpy.int64)<<32)+stage*4160+4*(ys*width+xs)
+    return names, simulate(stage, address, levels)
+
+def formatResults(names, results):
+    L=['%-10s' % 'stage'+''.join('%12s %8s' % (level.name+' misses', 'rate') for level, a, m in results)]
+    for i, name in enumerate(names):
+        row='%-10s' % name
+        for level, accesses, misses in results:
+            rate=float(misses[i])/accesses[i] if accesses[i] else 0.0
+            row+='%12d %8.4f' % (misses[i], rate)
+        L.append(row)
+    return '\n'.join(L)
+
+def tileSweep(width, height, tiles=[(32, 8), (64, 16), (128, 32), (256, 32), (512, 64)], levels=None):
+    '''misses of the tiled 3x3 box of tutorial6 (blur_x computed per tile) for several
+    tile sizes. Returns a list of (tile, results)'''
+    sweep=[]
+    for tx, ty in tiles:
+        schedule=scheduleSimulator.tile(tx, ty, {'blur_x':'xo'})
+        trace=scheduleSimulator.simulate(scheduleSimulator.box3x3, schedule, width, height)
+        results=simulateTrace(trace, levels)
+        sweep.append(((tx, ty), results))
+        print '\ntile ', tx, 'x', ty
+        print formatResults(trace.names, results)
+    return sweep
+
+def main():
+    levels=hostLevels()
+    print 'caches: ', levels
+    width, height = 512, 512
+    for i in [1, 2, 3]:
+        trace=scheduleSimulator.simulate(scheduleSimulator.box3x3,
+                                         scheduleSimulator.tutorial6Schedules[i], width, height)
+        print '\nschedule ', i
+        print formatResults(trace.names, simulateTrace(trace, levels))
+    if 'tiles' in sys.argv:
+        tileSweep(width, height, levels=levels)
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
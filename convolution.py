@@ -0,0 +1,271 @@
+# Convolution of an image by an arbitrary numpy kernel.
+
+# Like tutorial9_convolution, this is really a correlation: the kernel is not flipped.
+# out[y, x, c] = sum over dy, dx of kernel[dy, dx]*im[y+dy-kh/2, x+dx-kw/2, c]
+# with the image clamped to its edges.
+
+# The kernel is decomposed with an SVD into a sum of separable (outer product) terms.
+# A rank-1 kernel such as numpy.ones([w, w]) becomes a horizontal and a vertical pass,
+# a low-rank kernel becomes a few such passes summed together, and anything else
+# falls back to the dense RDom over the whole kernel. The choice is made by counting
+# multiply-adds per pixel.
+
+# Large kernels go through the FFT instead (fftConvolve, pure numpy). The image is
+# processed in overlapping blocks (overlap-save) so memory does not grow with the image.
+# measureCrossover times the three methods on the current machine for a grid of
+# kernel and image sizes and saves the table in Output/crossover.json, which convolve
+# then uses to choose.
+
+import os, sys
+from halide import *
+import time
+import json
+import numpy
+import synthetic
+
+# The fft estimate counts 2.5*N*log2(N) flops per real FFT of N points, against
+# multiply-adds for the Halide methods. numpy.fft works in double precision without
+# SIMD, while the Halide passes are vectorized 8 float32 lanes wide: its flops are
+# assumed to be about 4 times slower. measureCrossover replaces these estimates
+# with timings of the current machine.
+numpyFFTSlowdown=4
+
+crossoverPath=os.path.join('Output', 'crossover.json')
+
+def separableTerms(kernel, tol=1e-6):
+    '''decompose a 2D numpy kernel into vertical and horizontal taps such that
+    kernel = sum over t of numpy.outer(vertical[t], horizontal[t])
+    up to a Frobenius error of tol times the norm of the kernel.
+    Returns (vertical, horizontal) of shapes (rank, kh) and (rank, kw)'''
+    U, s, Vt = numpy.linalg.svd(numpy.asarray(kernel, numpy.float64))
+    # residual[k] is the error when keeping the first k terms
+    residual=numpy.sqrt(numpy.cumsum((s**2)[::-1])[::-1])
+    residual=numpy.append(residual, 0.0)
+    rank=int(numpy.argmax(residual<=tol*residual[0]))
+    if rank==0: rank=1 # null kernel
+    vertical=U[:, :rank].T
+    horizontal=s[:rank, None]*Vt[:rank]
+    return vertical, horizontal
+
+def fftSize(kernel, block=256):
+    '''side of the FFT blocks used by fftConvolve: a power of two at least block
+    and at least twice the kernel size'''
+    n=block
+    while n<2*numpy.max(numpy.shape(kernel)): n*=2
+    return n
+
+def costs(kernel, rank, block=256):
+    '''estimated multiply-adds per output pixel of the dense, separable and fft methods.
+    Each separable term also writes and reads back an intermediate, counted as 2 ops.
+    The fft cost is a forward and an inverse real FFT per block, amortized over the
+    valid part of the block, times numpyFFTSlowdown'''
+    kh, kw = numpy.shape(kernel)
+    n=fftSize(kernel, block)
+    valid=(n-kh+1)*(n-kw+1)
+    fft=numpyFFTSlowdown*2*2.5*numpy.log2(n*n)*n*n/valid
+    return {'dense': kh*kw, 'separable': rank*(kh+kw+2), 'fft': fft}
+
+def chooseMethod(kernel, tol=1e-6, imageShape=None, table=None):
+    '''returns ('dense', 'separable' or 'fft', vertical, horizontal).
+    If a crossover table measured by measureCrossover is given, the times measured for 
+    the closest kernel and image sizes decide, otherwise the estimates of costs'''
+    vertical, horizontal = separableTerms(kernel, tol)
+    rank=len(vertical)
+    if table is not None and imageShape is not None:
+        t=closestTimes(table, numpy.max(numpy.shape(kernel)), imageShape[0]*imageShape[1])
+        # the separable time was measured for a rank-1 kernel
+        c={'dense': t['dense'], 'separable': rank*t['separable'], 'fft': t['fft']}
+    else:
+        c=costs(kernel, rank)
+    # min and max are the ones of halide here
+    method=sorted(c, key=c.get)[0]
+    return method, vertical, horizontal
+
+def fftConvolve(im, kernel, block=256):
+    '''same convolution as convolve, computed with numpy.fft.rfft2 by overlap-save.
+    The clamped image is cut into overlapping blocks of fftSize(kernel, block) pixels,
+    each block is multiplied by the transform of the kernel and only the part of the 
+    result that does not wrap around is kept'''
+    kh, kw = numpy.shape(kernel)
+    n=fftSize(kernel, block)
+    validY, validX = n-kh+1, n-kw+1
+    height, width = im.shape[0], im.shape[1]
+    # clamp to the edges, kernel centered like in the Halide versions
+    pad=[(kh/2, kh-1-kh/2), (kw/2, kw-1-kw/2)]+[(0, 0)]*(im.ndim-2)
+    padded=numpy.pad(numpy.asarray(im, numpy.float32), pad, 'edge')
+    # correlation is convolution by the flipped kernel
+    K=numpy.fft.rfft2(numpy.asarray(kernel, numpy.float64)[::-1, ::-1], s=(n, n), axes=(0, 1))
+    if im.ndim==3: K=K[:, :, None]
+    out=numpy.empty(im.shape, numpy.float32)
+    for y in xrange(0, height, validY):
+        for x in xrange(0, width, validX):
+            tile=padded[y:y+n, x:x+n]
+            result=numpy.fft.irfft2(numpy.fft.rfft2(tile, s=(n, n), axes=(0, 1))*K, s=(n, n), axes=(0, 1))
+            # min is the one of halide here
+            h=validY if validY<=height-y else height-y
+            w=validX if validX<=width-x else width-x
+            out[y:y+h, x:x+w]=result[kh-1:kh-1+h, kw-1:kw-1+w]
+    return out
+
+def denseConvolutionFunc(input, kernel):
+    '''direct convolution with an RDom over the whole kernel'''
+    x, y, c = Var('x'), Var('y'), Var('c')
+    kh, kw = numpy.shape(kernel)
+    # kernel[dy, dx] in numpy is K[dx, dy] in Halide
+    K = Image(Float(32), numpy.array(kernel, numpy.float32))
+
+    clamped = Func('clamped')
+    clamped[x, y, c] = input[clamp(x, 0, input.width()-1),
+                             clamp(y, 0, input.height()-1), c]
+
+    r = RDom(0, kw, 0, kh, 'r')
+    conv = Func('denseConv')
+    conv[x,y,c] = 0.0
+    conv[x,y,c] += clamped[x+r.x-kw/2, y+r.y-kh/2, c]*K[r.x, r.y]
+
+    out = Func('convolution')
+    out[x,y,c] = conv[x,y,c]
+    out.parallel(y).vectorize(x, 8)
+    return out
+
+def separableConvolutionFunc(input, vertical, horizontal, tile=128):
+    '''sum of rank separable passes. The horizontal passes of all the terms are
+    computed together as one Func with an extra dimension t, per tile of the output'''
+    x, y, c, t = Var('x'), Var('y'), Var('c'), Var('t')
+    rank, kh = numpy.shape(vertical)
+    kw = numpy.shape(horizontal)[1]
+    # taps[t, i] in numpy is taps[i, t] in Halide
+    V = Image(Float(32), numpy.array(vertical, numpy.float32))
+    H = Image(Float(32), numpy.array(horizontal, numpy.float32))
+
+    clamped = Func('clamped')
+    clamped[x, y, c] = input[clamp(x, 0, input.width()-1),
+                             clamp(y, 0, input.height()-1), c]
+
+    rx = RDom(0, kw, 'rx')
+    pass_x = Func('pass_x')
+    pass_x[x,y,c,t] = 0.0
+    pass_x[x,y,c,t] += clamped[x+rx.x-kw/2, y, c]*H[rx.x, t]
+
+    clampedPassx = Func('clampedPassx')
+    clampedPassx[x, y, c, t] = pass_x[clamp(x, 0, input.width()-1),
+                                      clamp(y, 0, input.height()-1), c, t]
+
+    # r.x runs over the vertical taps, r.y over the terms
+    r = RDom(0, kh, 0, rank, 'r')
+    pass_y = Func('pass_y')
+    pass_y[x,y,c] = 0.0
+    pass_y[x,y,c] += clampedPassx[x, y+r.x-kh/2, c, r.y]*V[r.x, r.y]
+
+    out = Func('convolution')
+    out[x,y,c] = pass_y[x,y,c]
+
+    xi, yi, xo, yo=Var('xi'), Var('yi'), Var('xo'), Var('yo')
+    out.tile(x, y, xo, yo, xi, yi, tile, tile).parallel(yo).vectorize(xi, 8)
+    clampedPassx.compute_at(out, xo).vectorize(x, 8)
+    return out
+
+def convolutionFunc(input, kernel, method=None, tol=1e-6, tile=128):
+    '''Halide Func convolving the Halide Image input by a 2D numpy kernel.
+    method is 'dense', 'separable' or None for the cheaper of the two according to costs.
+    The fft method is not a Halide pipeline: convolve runs it with fftConvolve.
+    Returns the Func and the method used'''
+    if method=='fft':
+        raise ValueError('fft convolution is computed in numpy by fftConvolve, not by a Func')
+    vertical, horizontal = separableTerms(kernel, tol)
+    if method is None:
+        c=costs(kernel, len(vertical))
+        method='dense' if c['dense']<=c['separable'] else 'separable'
+    if method=='dense':
+        return denseConvolutionFunc(input, kernel), method
+    return separableConvolutionFunc(input, vertical, horizontal, tile), method
+
+def convolve(im, kernel, method=None, tol=1e-6, tile=128, numTimes=1, table=None):
+    '''convolve the numpy image im (y, x, c) by the 2D numpy kernel.
+    method is 'dense', 'separable', 'fft' or None to let chooseMethod decide, 
+    using the crossover table if given, by default the one saved by measureCrossover
+    if there is one (see loadCrossover).
+    Returns the numpy output and the time per run'''
+    if method is None: 
+        if table is None: table=loadCrossover()
+        method = chooseMethod(kernel, tol, im.shape, table)[0]
+    if method=='fft':
+        t=time.time()
+        for i in xrange(numTimes):
+            output=fftConvolve(im, kernel)
+        dt=(time.time()-t)/numTimes
+        print method, numpy.shape(kernel), 'took ', dt, 'seconds'
+        return output, dt
+    input = Image(Float(32), im)
+    out, method = convolutionFunc(input, kernel, method, tol, tile)
+    out.compile_jit()
+    t=time.time()
+    for i in xrange(numTimes):
+        output = out.realize(input.width(), input.height(), input.channels())
+    dt=(time.time()-t)/numTimes
+    print method, numpy.shape(kernel), 'took ', dt, 'seconds'
+    return numpy.array(Image(output)), dt
+
+def measureCrossover(kernelSizes=[3, 7, 15, 31, 63, 127], imageSizes=[256, 1024, 2048], 
+                     path=crossoverPath, numTimes=3):
+    '''time the dense, rank-1 separable and fft methods on random square images and 
+    kernels and save the table as json at path. Each entry of the table is 
+    [kernelSize, imageSize, {method: seconds}]'''
+    table=[]
+    for imageSize in imageSizes:
+        im=numpy.random.rand(imageSize, imageSize, 3).astype(numpy.float32)
+        for k in kernelSizes:
+            times={}
+            full=numpy.random.rand(k, k)
+            g=numpy.exp(-numpy.linspace(-2, 2, k)**2)
+            times['dense']=convolve(im, full, 'dense', numTimes=numTimes)[1]
+            times['separable']=convolve(im, numpy.outer(g, g), 'separable', numTimes=numTimes)[1]
+            times['fft']=convolve(im, full, 'fft', numTimes=numTimes)[1]
+            table.append([k, imageSize, times])
+
+    print '\n kernel  image      dense  separable        fft   best (full rank)'
+    for k, imageSize, times in table:
+        best='dense' if times['dense']<=times['fft'] else 'fft'
+        print '%7d %6d %10.4f %10.4f %10.4f   %s' % (k, imageSize, times['dense'], 
+                                                    times['separable'], times['fft'], best)
+    if not os.path.exists(os.path.dirname(path)): os.makedirs(os.path.dirname(path))
+    f=open(path, 'w')
+    json.dump(table, f)
+    f.close()
+    return table
+
+def loadCrossover(path=crossoverPath):
+    '''load a table saved by measureCrossover, None if there is none'''
+    if not os.path.exists(path): return None
+    f=open(path)
+    table=json.load(f)
+    f.close()
+    return table
+
+def closestTimes(table, kernelSize, pixels):
+    '''times of the table entry closest to the given kernel size and number of pixels,
+    scaled to that number of pixels'''
+    def distance(entry):
+        return (numpy.abs(numpy.log(float(entry[0])/kernelSize)) + 
+                numpy.abs(numpy.log(float(entry[1])**2/pixels)))
+    k, imageSize, times = sorted(table, key=distance)[0]
+    scale=float(pixels)/imageSize**2
+    return dict((m, t*scale) for m, t in times.iteritems())
+
+def main():
+    im=synthetic.benchmarkImage()
+    w=5
+    kernels={'box': numpy.ones([w,w])/w**2,
+             'gaussian': numpy.outer(numpy.hanning(w+2)[1:-1], numpy.hanning(w+2)[1:-1]),
+             'random': numpy.random.rand(w, w)}
+    for name, k in kernels.iteritems():
+        print '\n', name, 'kernel, estimated costs', costs(k, len(separableTerms(k)[0]))
+        for method in ['dense', 'separable', 'fft']:
+            out, dt=convolve(im, k, method, numTimes=5)
+
+    if 'crossover' in sys.argv: 
+        measureCrossover()
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
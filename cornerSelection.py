@@ -0,0 +1,140 @@
+# Selection of a fixed budget of corners from an (N, 3) array of (x, y, response)
+# as returned by harris.harrisCorners or harris-numpy with sparse=True.
+
+# The local max + threshold test keeps every bump of the response, so dense
+# textures produce a huge number of corners. topK keeps the strongest ones,
+# anms keeps the ones that are both strong and well spread over the image.
+
+import numpy
+
+def topK(corners, k):
+    '''return the k corners with the largest response, strongest first.
+    numpy.argpartition finds them in O(N), only the k survivors get sorted'''
+    if k>=len(corners):
+        return corners[numpy.argsort(-corners[:, 2], kind='mergesort')]
+    best=numpy.argpartition(-corners[:, 2], k-1)[:k]
+    return corners[best[numpy.argsort(-corners[best, 2], kind='mergesort')]]
+
+# coefficients of u and R in the cell offsets of the four sides of a ring
+ringU=(numpy.array([1, 0, -1, 0]), numpy.array([0, 1, 0, -1]))
+ringR=(numpy.array([-1, 1, 1, -1]), numpy.array([-1, -1, 1, 1]))
+
+class BlockGrids:
+    '''bucket grids over blocks of size consecutive points (starting at starts), one grid
+    per block with about one point per cell and cells at least cellSize wide.
+    The points of all the grids are stored together sorted by cell, so that nearest
+    neighbour queries to all the blocks walk their rings of cells as whole arrays'''
+
+    def __init__(self, xs, ys, starts, size, cellSize=1.0):
+        idx=starts[:, None]+numpy.arange(size)
+        px, py = xs[idx], ys[idx]
+        self.x0, self.y0 = px.min(axis=1), py.min(axis=1)
+        w, h = px.max(axis=1)-self.x0, py.max(axis=1)-self.y0
+        self.s=numpy.maximum(cellSize, numpy.sqrt((w+1)*(h+1)/size))
+        self.gw=(w//self.s).astype(numpy.int64)+1
+        self.gh=(h//self.s).astype(numpy.int64)+1
+        cells=self.gw*self.gh
+        self.offset=numpy.cumsum(cells)-cells
+        cx=((px-self.x0[:, None])//self.s[:, None]).astype(numpy.int64)
+        cy=((py-self.y0[:, None])//self.s[:, None]).astype(numpy.int64)
+        cell=(self.offset[:, None]+cy*self.gw[:, None]+cx).ravel()
+        byCell=numpy.argsort(cell, kind='mergesort')
+        self.points=idx.ravel()[byCell]
+        # the points of cell j are points[start[j]:start[j+1]]
+        self.start=numpy.searchsorted(cell[byCell], numpy.arange(cells.sum()+1))
+
+    def nearest(self, xs, ys, queries, blocks, best, cap=0.0):
+        '''lower best[queries] (squared distances) to the squared distance from each query
+        point to the closest point of its block. Rings of cells are walked around every
+        query until no unvisited cell can hold a point closer than best, or until best
+        is below cap, when the exact distance is not needed'''
+        qx, qy = xs[queries], ys[queries]
+        s, gw, gh = self.s[blocks], self.gw[blocks], self.gh[blocks]
+        cx=numpy.floor((qx-self.x0[blocks])/s).astype(numpy.int64)
+        cy=numpy.floor((qy-self.y0[blocks])/s).astype(numpy.int64)
+        # rings closer than the grid are empty, rings further than last are outside it
+        ring=numpy.maximum.reduce([numpy.zeros_like(cx), -cx, cx-gw+1, -cy, cy-gh+1])
+        last=numpy.maximum.reduce([cx, gw-1-cx, cy, gh-1-cy])
+        b=best[queries]
+        # any point in ring R is at least (R-1)*s away
+        active=numpy.flatnonzero((numpy.maximum(ring-1, 0)*s)**2<b)
+        while len(active):
+            R=ring[active]
+            n=numpy.where(R==0, 1, 8*R)
+            q=numpy.repeat(active, n)
+            t=numpy.arange(n.sum())-numpy.repeat(numpy.cumsum(n)-n, n)
+            Rq=numpy.repeat(R, n)
+            # walk the four sides of the ring, 2R cells each:
+            # (u-R, -R), (R, u-R), (R-u, R), (-R, R-u)
+            side, u = t//numpy.maximum(2*Rq, 1), t%numpy.maximum(2*Rq, 1)
+            dx=ringU[0][side]*u+ringR[0][side]*Rq
+            dy=ringU[1][side]*u+ringR[1][side]*Rq
+            ccx, ccy = cx[q]+dx, cy[q]+dy
+            inside=(ccx>=0)&(ccx<gw[q])&(ccy>=0)&(ccy<gh[q])
+            q, ccx, ccy = q[inside], ccx[inside], ccy[inside]
+            cell=self.offset[blocks[q]]+ccy*gw[q]+ccx
+            lo, count = self.start[cell], self.start[cell+1]-self.start[cell]
+            q=numpy.repeat(q, count)
+            i=self.points[numpy.repeat(lo, count)+numpy.arange(count.sum())
+                          -numpy.repeat(numpy.cumsum(count)-count, count)]
+            d=(xs[i]-qx[q])**2+(ys[i]-qy[q])**2
+            if len(d):
+                # q is sorted: one minimum per query
+                first=numpy.flatnonzero(numpy.concatenate(([True], q[1:]!=q[:-1])))
+                found=q[first]
+                b[found]=numpy.minimum(b[found], numpy.minimum.reduceat(d, first))
+            # any point in the next ring is at least R*s away
+            done=(b[active]<=(R*s[active])**2)|(R>=last[active])|(b[active]<cap)
+            active=active[~done]
+            ring[active]+=1
+        best[queries]=b
+
+def anms(corners, k, cRobust=0.9, cellSize=None):
+    '''adaptive non-maximal suppression (Brown, Szeliski and Winder 2005).
+    The suppression radius of a corner is its distance to the closest corner whose
+    response is significantly larger (response < cRobust*other). The k corners with
+    the largest radii are returned, largest radius first.
+    In decreasing response order, the corners that suppress corner i are the first p[i].
+    That prefix is cut into blocks of power of two sizes (the bits of p[i]), and the
+    nearest corner of every block of a size is found at once with BlockGrids, from the
+    largest blocks, holding the strongest corners, to the smallest ones.
+    The corners are processed by increasing p, strongest first, and the exact radii
+    found so far bound the k-th largest radius from below: a corner that is closer
+    than that to a stronger one cannot be selected, and its search stops there.
+    The selected radii are exact. cellSize is the smallest cell side of the grids,
+    1 pixel by default'''
+    n=len(corners)
+    k=min(k, n)
+
+    order=numpy.argsort(-corners[:, 2], kind='mergesort')
+    xs=corners[order, 0].astype(numpy.float64)
+    ys=corners[order, 1].astype(numpy.float64)
+    # float32 responses scaled by a python float compare in double precision
+    r=corners[order, 2].astype(numpy.float64)
+    # number of corners j with r[i]<cRobust*r[j], a prefix since r is decreasing
+    p=numpy.searchsorted(-cRobust*r, -r, side='left')
+    bits=numpy.frexp(p)[1] # bit length of p
+
+    best=numpy.empty(n) # squared radii, upper bounds of the dropped corners
+    best.fill(numpy.inf)
+    dropped=numpy.zeros(n, bool)
+    bound=0.0 # squared lower bound of the k-th largest radius
+    for generation in xrange(1, int(bits.max())+1 if n else 0):
+        members=numpy.flatnonzero(bits==generation)
+        for level in reversed(xrange(generation)):
+            queries=members[((p[members]>>level)&1).astype(bool)&~dropped[members]]
+            if len(queries)==0: continue
+            # the block of the prefix at this level, in units of 2**level corners
+            blocks, which = numpy.unique((p[queries]>>level)-1, return_inverse=True)
+            grids=BlockGrids(xs, ys, blocks<<level, 1<<level, 1.0 if cellSize is None else cellSize)
+            grids.nearest(xs, ys, queries, which, best, bound)
+            dropped[queries]|=best[queries]<bound
+        exact=best[(bits<=generation)&~dropped]
+        if len(exact)>=k:
+            bound=max(bound, numpy.partition(exact, len(exact)-k)[len(exact)-k])
+    radius=numpy.sqrt(best)
+
+    # largest radii first, ties broken by response since order is sorted by response.
+    # Many corners share an infinite radius: argpartition would pick any of them
+    best=numpy.lexsort((numpy.arange(n), -radius))[:k]
+    return corners[order[best]]
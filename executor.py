@@ -0,0 +1,123 @@
+# Concurrent execution of a mix of pipelines within a global core budget.
+
+# Every Halide runtime starts one worker thread per core for its parallel loops.
+# Several pipelines realized at the same time, each with its own runtime, therefore
+# run cores*jobs threads on cores cores. Here the jobs run in worker processes: each
+# one sets HL_NUM_THREADS before the Halide runtime starts, so that workers*threads
+# stays within the budget. Worker processes also take the GIL out of the picture:
+# a realize from the Python bindings keeps it, so Python threads would run one
+# realize at a time.
+# split chooses the number of workers and of Halide threads per worker. Since no
+# schedule scales perfectly (see threadScaling), running more jobs with fewer threads
+# each gives more throughput, as long as there are jobs to run.
+#
+#   python executor.py              budget of all the cores, every split is measured
+#   python executor.py 8            budget of 8 cores
+#   python executor.py 8 2          budget of 8 cores, 2 workers of 4 threads
+
+import os, sys
+import time
+import multiprocessing
+import numpy
+import synthetic
+
+def split(budget, jobs, workers=None):
+    '''(workers, Halide threads per worker) for jobs jobs on budget cores.
+    Every job gets its own worker up to the budget, the cores left are shared
+    as threads'''
+    if workers is None:
+        workers=jobs if jobs<budget else budget
+    if workers<1: workers=1
+    threads=budget/workers
+    if threads<1: threads=1
+    return workers, threads
+
+def pipelineRegistry():
+    '''name -> function of the inputs of a job returning output, dt.
+    Imported in the workers only: the Halide runtime must not start in the parent'''
+    import tutorial10_convolutionSchedule
+    import harris
+    import reference
+    return {'boxBlur': lambda im, i=5: tutorial10_convolutionSchedule.boxBlur(im, i, 256, 256),
+            'harris': lambda im, i=1: harris.computeHarris(im, i),
+            'numpy boxBlur': lambda im: reference.run(reference.boxBlur, (im,), 1),
+            'numpy harris': lambda im: reference.run(reference.harris, (im,), 1)}
+
+def startWorker(threads):
+    '''initializer of the worker processes, before any realize'''
+    os.environ['HL_NUM_THREADS']=str(threads)
+    # older runtimes read HL_NUMTHREADS
+    os.environ['HL_NUMTHREADS']=str(threads)
+    # numpy can use a BLAS thread pool too
+    os.environ['OMP_NUM_THREADS']=str(threads)
+
+def runJob(job):
+    '''run one (pipeline, inputs) job in a worker.
+    Returns the pipeline name, the number of pixels and the time of the job'''
+    name, inputs = job
+    f=pipelineRegistry()[name]
+    t=time.time()
+    f(*inputs)
+    dt=time.time()-t
+    im=inputs[0]
+    return name, im.shape[0]*im.shape[1], dt
+
+def execute(jobs, budget=None, workers=None):
+    '''run the (pipeline name, inputs) jobs concurrently within budget cores.
+    Returns (workers, threads, wall time, list of (name, pixels, dt) of the jobs)'''
+    if budget is None: budget=multiprocessing.cpu_count()
+    workers, threads = split(budget, len(jobs), workers)
+    print '\n', len(jobs), 'jobs on ', budget, 'cores: ', workers, 'workers of ', threads, 'Halide threads'
+    pool=multiprocessing.Pool(workers, startWorker, (threads,))
+    t=time.time()
+    results=list(pool.imap_unordered(runJob, jobs))
+    wall=time.time()-t
+    pool.close()
+    pool.join()
+    return workers, threads, wall, results
+
+def throughput(wall, results):
+    '''jobs per second, megapixels per second and the mean time of a job of each pipeline'''
+    pixels=0
+    perPipeline={}
+    for name, n, dt in results:
+        pixels+=n
+        perPipeline.setdefault(name, []).append(dt)
+    means=dict((name, numpy.mean(times)) for name, times in perPipeline.iteritems())
+    return len(results)/wall, pixels/wall/1e6, means
+
+def formatThroughput(workers, threads, wall, results):
+    jobsPerSecond, mpixPerSecond, means = throughput(wall, results)
+    L=['%d workers x %d threads: %.2f jobs/s, %.2f Mpix/s, %.3f s' % (workers, threads,
+        jobsPerSecond, mpixPerSecond, wall)]
+    for name in sorted(means):
+        L.append('    %-14s %8.4f s per job' % (name, means[name]))
+    return '\n'.join(L)
+
+def mix(count=32, sizes=[256, 512, 1024]):
+    '''count jobs alternating the pipelines of pipelineRegistry on synthetic images'''
+    names=['boxBlur', 'harris', 'numpy boxBlur', 'numpy harris']
+    images=[numpy.array(synthetic.image('pink', s, s)) for s in sizes]
+    return [(names[i%len(names)], (images[i%len(images)],)) for i in xrange(count)]
+
+def main():
+    budget=int(sys.argv[1]) if len(sys.argv)>1 else multiprocessing.cpu_count()
+    jobs=mix()
+    if len(sys.argv)>2:
+        splits=[int(sys.argv[2])]
+    else:
+        # from a single worker using every core to one worker per core
+        splits, w = [], 1
+        while w<budget:
+            splits.append(w)
+            w*=2
+        splits.append(budget)
+    reports=[]
+    for w in splits:
+        reports.append(formatThroughput(*execute(jobs, budget, w)))
+    print
+    for r in reports: print r
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
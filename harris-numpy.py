@@ -1,11 +1,23 @@
 import imageIO
+import cornerSelection
 import numpy as np
 from scipy import ndimage
 import time
 
 Sobel=np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])
 
-def harris(im, sigmaG=1, factor=4, k = 0.15, thr=0.0, debug=False):
+def cornerList(thresholded, M):
+    '''compact a dense corner mask into an (N, 3) array of (x, y, response)'''
+    ys, xs = np.nonzero(thresholded)
+    corners=np.empty((len(xs), 3))
+    corners[:, 0]=xs
+    corners[:, 1]=ys
+    corners[:, 2]=M[ys, xs]
+    return corners
+
+def harris(im, sigmaG=1, factor=4, k = 0.15, thr=0.0, debug=False, sparse=False, maxCorners=None):
+    '''returns a dense mask of the corners, or an (N, 3) array of (x, y, response) if sparse.
+    maxCorners limits the sparse output to the best spread corners (adaptive non-maximal suppression)'''
 
 	#compute luminance and blur
     L=np.dot(im, np.array([0.3, 0.6, 0.1]))
@@ -41,6 +53,10 @@ def harris(im, sigmaG=1, factor=4, k = 0.15, thr=0.0, debug=False):
     thresholded[1:-1, 1:-1][ notmaxi3]=0.0
     thresholded[1:-1, 1:-1][ notmaxi4]=0.0
 
+    if sparse: 
+        corners=cornerList(thresholded, M)
+        if maxCorners is not None: corners=cornerSelection.anms(corners, maxCorners)
+        return corners
     return thresholded;
 
 
@@ -4,14 +4,17 @@ from halide import *
 #Python Imaging Library will be used for IO
 import imageIO
 import time
-
-def clampIt(input, refImage, name='clamped'):
-    #TODO : different case if 2 or 3 channels
-    x, y = Var('x'), Var('y')
-    clamped = Func(name) 
-    clamped[x, y] = input[clamp(x, 0, refImage.width()-1),
-                          clamp(y, 0, refImage.height()-1)]
-    return clamped
+import math
+import numpy
+import synthetic
+import cornerSelection
+import boundary
+import profiling
+import reference
+
+def clampIt(input, refImage, name='clamped', channels=False):
+    # no clamping at all if refImage is a boundary.Interior
+    return boundary.bounded(input, refImage, 'repeat_edge', channels, name)
 
 def luminance(input):
     x, y, c = Var('x'), Var('y'), Var('c')
@@ -19,8 +22,16 @@ def luminance(input):
     lumi[x,y]=0.3*input[x, y, 0]+0.6*input[x, y, 1]+0.1*input[x,y,2]
     return lumi
 
-def GaussianSingleChannel(input, refImage, sigma, trunc=3):
-    '''take kernel as argument ?'''
+# above this sigma, Gaussian blurs use the recursive filter whose cost does not depend on sigma
+iirSigma=3.0
+
+def GaussianSingleChannel(input, refImage, sigma, trunc=3, method=None):
+    '''take kernel as argument ?
+    method is 'fir' (direct convolution by a kernel truncated at trunc*sigma) or 'iir' 
+    (see GaussianIIR). By default, 'iir' is used for sigma>=iirSigma'''
+
+    if method is None: method = 'iir' if sigma>=iirSigma else 'fir'
+    if method=='iir': return GaussianIIR(input, refImage, sigma)
 
     x, y = Var('x'), Var('y') #declare domain variables
 
@@ -57,6 +68,140 @@ def GaussianSingleChannel(input, refImage, sigma, trunc=3):
 
     return blur, clampedBlurx
 
+def GaussianStructureTensor(gx, gy, refImage, sigma, trunc=3, method=None):
+    '''blur the three products Ix2, Iy2 and IxIy of the structure tensor in a single 
+    separable pass. The tensor is a 3-channel Func so that the kernel and the gradient
+    loads are shared and the intermediate is stored interleaved (see interleaveChannels).
+    method is chosen as in GaussianSingleChannel.
+    Returns blur, tensor and clampedBlurx'''
+
+    x, y, c = Var('x'), Var('y'), Var('c')
+
+    tensor = Func('tensor')
+    tensor[x,y,c]=select(c==0, gx[x,y]**2, 
+                         select(c==1, gy[x,y]**2, gx[x,y]*gy[x,y]))
+
+    if method is None: method = 'iir' if sigma>=iirSigma else 'fir'
+    if method=='iir': 
+        blur, blurX = GaussianIIR(tensor, refImage, sigma, True)
+        return blur, tensor, blurX
+
+    blur_x = Func('tensorBlur_x') 
+    blur_y = Func('tensorBlur_y')
+    blur   = Func('tensorBlur')
+
+    #Gaussian kernel, shared by the three channels
+    kernel = Func('tensorKernel')
+    kernel_width = int(sigma*trunc*2+1)   
+
+    kernel[x]=exp(-(x- kernel_width/2.0)**2/(2.0*sigma**2))
+    kernel.compute_root()
+
+    clamped = clampIt(tensor, refImage, 'clampedTensor', True)
+
+    rx = RDom(0,    kernel_width, 'rx')                            
+    blur_x[x,y,c] = 0.0
+    blur_x[x,y,c] += clamped[x+rx.x-kernel_width/2, y, c] *kernel[rx.x]
+
+    clampedBlurx = clampIt(blur_x, refImage, 'clampedTensorBlurx', True)
+
+    ry = RDom(0,    kernel_width, 'ry')                
+    blur_y[x,y,c] = 0.0
+    blur_y[x,y,c] += clampedBlurx[x, y+ry.x-kernel_width/2, c]*kernel[ry.x]
+    
+    blur[x,y,c] = blur_y[x,y,c]/(2*3.14159*sigma**2)
+
+    return blur, tensor, clampedBlurx
+
+def youngVanVlietCoefficients(sigma):
+    '''coefficients (B, a1, a2, a3) of the recursive Gaussian of Young and van Vliet (1995)
+    out[n] = B*in[n] + a1*out[n-1] + a2*out[n-2] + a3*out[n-3]
+    applied once forward and once backward along each axis. Valid for sigma>=0.5'''
+    if sigma>=2.5: q=0.98711*sigma-0.96330
+    else: q=3.97156-4.14554*math.sqrt(1-0.26891*sigma)
+    b0=1.57825+2.44413*q+1.4281*q**2+0.422205*q**3
+    b1=2.44413*q+2.85619*q**2+1.26661*q**3
+    b2=-(1.4281*q**2+1.26661*q**3)
+    b3=0.422205*q**3
+    return 1-(b1+b2+b3)/b0, b1/b0, b2/b0, b3/b0
+
+def GaussianIIR(input, refImage, sigma, channels=False):
+    '''recursive Gaussian blur whose cost per pixel does not depend on sigma.
+    Each axis gets a causal and an anti-causal recursion (youngVanVlietCoefficients), 
+    expressed as scans over the full width or height. The scans are computed at root, 
+    in parallel over rows (columns) and vectorized across neighboring rows (columns).
+    The recursions start in the steady state of the edge pixel, which approximates 
+    clamping to the edge. Set channels to blur a Func of x, y, c.
+    Returns blur and the horizontal pass, like GaussianSingleChannel'''
+
+    x, y, c = Var('x'), Var('y'), Var('c')
+    xo, xi, yo, yi = Var('xo'), Var('xi'), Var('yo'), Var('yi')
+    extra = (c,) if channels else ()
+    width, height = refImage.width(), refImage.height()
+    B, a1, a2, a3 = youngVanVlietCoefficients(sigma)
+
+    def step(input, output, at):
+        # at(k) are the coordinates k samples behind the current one along the scan
+        return B*input[at(0)] + a1*output[at(1)] + a2*output[at(2)] + a3*output[at(3)]
+
+    clamped = clampIt(input, refImage, 'clampedInputOfIIRBlur', channels)
+
+    causal_x, blur_x = Func('iirCausal_x'), Func('iirBlur_x')
+    causal_y, blur_y = Func('iirCausal_y'), Func('iirBlur_y')
+    blur = Func('iirBlur')
+
+    rx = RDom(0, width, 'rx')
+    r, n = rx.x, width-1-rx.x
+    causal_x[(x, y)+extra] = clamped[(x, y)+extra]
+    causal_x[(r, y)+extra] = step(clamped, causal_x, lambda k: (max(r-k, 0), y)+extra)
+    blur_x[(x, y)+extra] = causal_x[(x, y)+extra]
+    blur_x[(n, y)+extra] = step(causal_x, blur_x, lambda k: (min(n+k, width-1), y)+extra)
+
+    ry = RDom(0, height, 'ry')
+    r, n = ry.x, height-1-ry.x
+    causal_y[(x, y)+extra] = blur_x[(x, y)+extra]
+    causal_y[(x, r)+extra] = step(blur_x, causal_y, lambda k: (x, max(r-k, 0))+extra)
+    blur_y[(x, y)+extra] = causal_y[(x, y)+extra]
+    blur_y[(x, n)+extra] = step(causal_y, blur_y, lambda k: (x, min(n+k, height-1))+extra)
+
+    blur[(x, y)+extra] = blur_y[(x, y)+extra]
+
+    # the scans need complete rows (columns): compute them at root. 
+    # Rows are independent, so the horizontal scans run in parallel over blocks of 8 rows 
+    # and each step is a vector of 8 rows. Same thing for the columns of the vertical scans
+    for f in [causal_x, blur_x]:
+        f.compute_root().parallel(y)
+        f.update().split(y, yo, yi, 8).reorder(yi, rx.x, yo).vectorize(yi).parallel(yo)
+    for f in [causal_y, blur_y]:
+        f.compute_root().parallel(y)
+        f.update().split(x, xo, xi, 8).reorder(xi, ry.x, xo).vectorize(xi).parallel(xo)
+
+    return blur, blur_x
+
+def checkGaussianAccuracy(im, sigma, trunc=3):
+    '''blur the luminance of im with both the 'fir' and the 'iir' path of GaussianSingleChannel.
+    Returns the maximum absolute difference over the whole image and away from the borders
+    (where the edge handling of the two paths differ), relative to the maximum of the blur'''
+    input = Image(Float(32), im)
+    outputs = {}
+    for method in ['fir', 'iir']:
+        lumi = luminance(input)
+        blur, blurX = GaussianSingleChannel(lumi, input, sigma, trunc, method)
+        blurX.compute_root()
+        blur.compile_jit()
+        outputs[method] = numpy.array(Image(blur.realize(input.width(), input.height())))
+    diff = numpy.abs(outputs['iir']-outputs['fir'])/numpy.max(numpy.abs(outputs['fir']))
+    border = int(trunc*sigma)+1
+    interior = diff[border:-border, border:-border]
+    print 'sigma ', sigma, 'max relative error: %.5f, away from borders: %.5f' % (diff.max(), interior.max())
+    return diff.max(), interior.max()
+
+def interleaveChannels(f):
+    '''compute the channels of a 3-channel Func together and store them next to each 
+    other, so that a pixel of the tensor is a single 12-byte load'''
+    x, y, c = Var('x'), Var('y'), Var('c')
+    f.reorder(c, x, y).reorder_storage(c, x, y).unroll(c)
+
 def SobelX(input, refImage):
     x, y = Var('x'), Var('y')
     sobel=Func('SobelX')
@@ -85,41 +230,52 @@ def amILocalMax(input, refImage):
     x, y = Var('x'), Var('y')
     maxi=Func('maxi')
     input=clampIt(input, refImage)
-    maxi[x,y]=select( (input[x,y]>input[x-1, y] ) 
-                  and (input[x,y]>input[x+1, y] )
-                  and (input[x,y]>input[x, y-1] )
-                  and (input[x,y]>input[x, y+1] ),
-                  1.0, 0.0)
+    # python's 'and' does not build a Halide Expr: it would only keep the last test
+    maxi[x,y]=select(input[x,y]>input[x-1, y], 
+              select(input[x,y]>input[x+1, y], 
+              select(input[x,y]>input[x, y-1], 
+              select(input[x,y]>input[x, y+1], 1.0, 0.0), 0.0), 0.0), 0.0)
     return maxi
 
-def computeHarris(im, indexOfSchedule, tile=256):
-    
-    sigma=0.5
-    k = 0.04
-    threshold=0.0
+def harrisStages(input, sigma=0.5, k=0.04, threshold=0.0, fusedTensor=True, refImage=None):
+    '''build the Harris pipeline on the Halide Image input.
+    Returns (harris, stages) where stages maps the name of every producer that
+    might not want to be computed inline to its Func.
+    With fusedTensor, the three tensor products are blurred together by 
+    GaussianStructureTensor instead of three calls to GaussianSingleChannel.
+    The stencils are clamped to the bounds of refImage (input by default), 
+    pass a boundary.Interior to build the pipeline without any clamping'''
 
-    input = Image(Float(32), im)
+    if refImage is None: refImage=input
 
     lumi=luminance(input)
-    blurredLumi, blurredLumiXX=GaussianSingleChannel(lumi, input, sigma)
-
-    gx=SobelX(blurredLumi, input)
-    gy=SobelY(blurredLumi, input)
+    blurredLumi, blurredLumiXX=GaussianSingleChannel(lumi, refImage, sigma)
 
+    gx=SobelX(blurredLumi, refImage)
+    gy=SobelY(blurredLumi, refImage)
 
-    # Form the tensor
     x, y = Var('x'), Var('y')
-    ix2=Func('Ix2')
-    iy2=Func('Iy2')
-    ixiy=Func('IxIy')
-    ix2[x,y] = gx[x,y]**2
-    iy2[x,y] = gy[x,y]**2
-    ixiy[x,y]=gx[x,y]*gy[x,y]
-
-    # Now blur tensor
-    ix2Blur, ix2BlurXX=GaussianSingleChannel(ix2, input, 4.0*sigma)
-    iy2Blur, iy2BlurXX=GaussianSingleChannel(iy2, input, 4.0*sigma)
-    ixiyBlur, ixiyBlurXX=GaussianSingleChannel(ixiy, input, 4.0*sigma)
+
+    if fusedTensor:
+        # Form and blur the tensor in one pass
+        tensorBlur, tensor, tensorBlurXX=GaussianStructureTensor(gx, gy, refImage, 4.0*sigma)
+        ix2Blur, iy2Blur, ixiyBlur = Func('Ix2Blur'), Func('Iy2Blur'), Func('IxIyBlur')
+        ix2Blur[x,y]=tensorBlur[x,y,0]
+        iy2Blur[x,y]=tensorBlur[x,y,1]
+        ixiyBlur[x,y]=tensorBlur[x,y,2]
+    else:
+        # Form the tensor
+        ix2=Func('Ix2')
+        iy2=Func('Iy2')
+        ixiy=Func('IxIy')
+        ix2[x,y] = gx[x,y]**2
+        iy2[x,y] = gy[x,y]**2
+        ixiy[x,y]=gx[x,y]*gy[x,y]
+
+        # Now blur tensor
+        ix2Blur, ix2BlurXX=GaussianSingleChannel(ix2, refImage, 4.0*sigma)
+        iy2Blur, iy2BlurXX=GaussianSingleChannel(iy2, refImage, 4.0*sigma)
+        ixiyBlur, ixiyBlurXX=GaussianSingleChannel(ixiy, refImage, 4.0*sigma)
 
     # Compute the trace
     trace=Func('trace')
@@ -136,83 +292,144 @@ def computeHarris(im, indexOfSchedule, tile=256):
     # threshold
     thresh=amIAbove(R, threshold)
     #local max
-    maxi=amILocalMax(R, input)
+    maxi=amILocalMax(R, refImage)
     
     harris = Func('Harris')
     harris[x,y]=maxi[x,y]*thresh[x,y]
 
-    #harris.compile_JIT()
-
-    ###### Schedule 
-    xi, yi = Var('xi'), Var('yi')
-
-    #harris.tile(x, y, xi, yi, 64, 64) 
-
     ## list of all stages that might not want to be computed inline
-    # if False:
     #     lumi, consumed by blurredLumiXX
-    #     blurredLumiXX consumed by gx and gy
+    #     blurredLumiXX consumed by blurredLumi
+    #     blurredLumi consumed by gx and gy (inlined into the tensor)
 
     #     ix2 consumed by ix2BlurXX
     #     iy2 consumed by iy2BlurXX
     #     ixiy consumed by ixiyBlurXX
+    #  or tensor consumed by tensorBlurXX
 
     #     ix2BlurXX consumed by ix2Blur
     #     iy2BlurXX consumed by iy2Blur
     #     ixiyBlurXX consumed by ixiyBlur
+    #  or tensorBlurXX consumed by tensorBlur
 
     #     R consumed by amILocalMax
+    stages={'lumi':lumi, 'blurredLumiXX':blurredLumiXX, 'blurredLumi':blurredLumi, 'R':R}
+    if fusedTensor:
+        stages.update({'tensor':tensor, 'tensorBlurXX':tensorBlurXX})
+    else:
+        stages.update({'ix2':ix2, 'iy2':iy2, 'ixiy':ixiy, 
+                       'ix2BlurXX':ix2BlurXX, 'iy2BlurXX':iy2BlurXX, 'ixiyBlurXX':ixiyBlurXX})
+    return harris, stages
+
+# stages of harrisStages that have three interleaved channels 
+tensorStages=['tensor', 'tensorBlurXX']
+
+def harrisStageGraph(sigma=0.5, trunc=3, fusedTensor=True):
+    '''static description of the stages returned by harrisStages, in producer to consumer order.
+    Each entry is (name, consumers, cost, channels, placements) where consumers maps the 
+    name of a consuming stage ('Harris' for the output) to its stencil radius (rx, ry), 
+    cost is a rough number of arithmetic operations per output pixel, channels the number
+    of float32 values stored per pixel and placements the list of legal placements 
+    (None if any placement is legal)'''
+
+    def blurModel(s):
+        # stencil radius and cost of one pass of a Gaussian blur, and the placements 
+        # allowed for its horizontal pass. The recursive blur scans whole rows at root
+        if s>=iirSigma: return 0, 16, ['root']
+        r=int(s*trunc*2+1)/2
+        return r, 2*(2*r+1), None
+
+    r1, c1, p1 = blurModel(sigma)
+    r2, c2, p2 = blurModel(4.0*sigma)
+    graph=[('lumi',          {'blurredLumiXX':(r1, 0)}, 5, 1, None),
+           ('blurredLumiXX', {'blurredLumi':(0, r1)}, c1, 1, p1)]
+    if fusedTensor:
+        graph+=[('blurredLumi',  {'tensor':(1, 1)}, c1+1, 1, None),
+                ('tensor',       {'tensorBlurXX':(r2, 0)}, 3*10, 3, None),
+                ('tensorBlurXX', {'R':(0, r2)}, 3*c2, 3, p2)]
+    else:
+        graph+=[('blurredLumi',   {'ix2':(1, 1), 'iy2':(1, 1), 'ixiy':(1, 1)}, c1+1, 1, None),
+                ('ix2',           {'ix2BlurXX':(r2, 0)}, 10, 1, None),
+                ('iy2',           {'iy2BlurXX':(r2, 0)}, 10, 1, None),
+                ('ixiy',          {'ixiyBlurXX':(r2, 0)}, 10, 1, None),
+                ('ix2BlurXX',     {'R':(0, r2)}, c2, 1, p2),
+                ('iy2BlurXX',     {'R':(0, r2)}, c2, 1, p2),
+                ('ixiyBlurXX',    {'R':(0, r2)}, c2, 1, p2)]
+    graph+=[('R',             {'Harris':(1, 1)}, 3*c2+10, 1, None)]
+    return graph
+
+def applyPlacement(harris, stages, placement, tile=256, tileX=None):
+    '''schedule the Harris pipeline from a dict mapping stage names to 'inline', 'root'
+    or a loop level of the tiled output ('y', 'x' or 'yi'). 
+    If tile is None the output is not tiled and only 'inline' and 'root' make sense.
+    tileX overrides the tile width, for outputs that pack several pixels along x'''
+    x, y, xi, yi = Var('x'), Var('y'), Var('xi'), Var('yi')
+    if tile is not None:
+        if tileX is None: tileX=tile
+        harris.tile(x, y, xi, yi, tileX, tile)
+    levels={'y':y, 'x':x, 'yi':yi}
+    for name, where in placement.iteritems():
+        if where=='inline': continue
+        if where=='root':
+            stages[name].compute_root()
+        else:
+            stages[name].compute_at(harris, levels[where])
+        if name in tensorStages:
+            interleaveChannels(stages[name])
+
+def harrisFunc(input, indexOfSchedule, tile=256, placement=None, fusedTensor=True):
+    '''the Harris pipeline on the Halide Image input, scheduled with one of the schedules
+    below or a placement dict. Returns the output Func, not compiled'''
+
+    sigma=0.5
+    k = 0.04
+    threshold=0.0
 
-    #     harris
+    harris, stages = harrisStages(input, sigma, k, threshold, fusedTensor)
+
+    #harris.compile_JIT()
+
+    ###### Schedule 
+
+    #harris.tile(x, y, xi, yi, 64, 64) 
+
+    #schedule found by scheduleSearch or written by hand as a placement dict
+    if placement is not None:
+        applyPlacement(harris, stages, placement, tile)
+        print 'placement ', placement
 
     #semi smart schedule. Root everything used by a stencil
     if indexOfSchedule==0:
         #harris.compute_root()
-        R.compute_root()
-        
-        ix2BlurXX.compute_root()
-        iy2BlurXX.compute_root()
-        ixiyBlurXX.compute_root()
-
-        ix2.compute_root()
-        iy2.compute_root()
-        ixiy.compute_root()
-
-        blurredLumi.compute_root()
-        lumi.compute_root()
+        placement=dict((name, 'root') for name in stages if name!='blurredLumiXX')
+        applyPlacement(harris, stages, placement, None)
         print 'root for all stencil producers'
 
-    if indexOfSchedule==1: 
-        harris.tile(x, y, xi, yi, tile, tile)
-        R.compute_at(harris, x)
-        
-        ix2BlurXX.compute_at(harris, x)
-        iy2BlurXX.compute_at(harris, x)
-        ixiyBlurXX.compute_at(harris, x)
-
-        ix2.compute_at(harris, x)
-        iy2.compute_at(harris, x)
-        ixiy.compute_at(harris, x)
-
-        blurredLumi.compute_at(harris, x)
+    if indexOfSchedule==1 or indexOfSchedule==2: 
         #lumi.compute_root()
+        placement=dict((name, 'x') for name in stages 
+                       if name not in ['lumi', 'blurredLumiXX'])
+        applyPlacement(harris, stages, placement, tile)
         print 'tile everything by ', tile
 
-    if indexOfSchedule==2: 
-        harris.tile(x, y, xi, yi, tile, tile)
-        R.compute_at(harris, x)
-        
-        ix2BlurXX.compute_at(harris, x)
-        iy2BlurXX.compute_at(harris, x)
-        ixiyBlurXX.compute_at(harris, x)
+    return harris
 
-        ix2.compute_at(harris, x)
-        iy2.compute_at(harris, x)
-        ixiy.compute_at(harris, x)
+def computeHarris(im, indexOfSchedule, tile=256, placement=None, fusedTensor=True, profile=None):
+    '''realize the Harris pipeline with one of the schedules of harrisFunc or a placement dict.
+    With profile set to 'table' or 'json', the pipeline is compiled with the profiler
+    and the time and allocations of every Func are printed (see profiling)'''
 
-        blurredLumi.compute_at(harris, x)
-        #lumi.compute_root()
-        print 'tile everything by ', tile
+    input = Image(Float(32), im)
+    harris = harrisFunc(input, indexOfSchedule, tile, placement, fusedTensor)
+
+    if profile is not None:
+        output, dt, report = profiling.realizeProfiled(harris, (input.width(), input.height()))
+        print indexOfSchedule, 'took ', dt, 'seconds'
+        if not report:
+            print 'no report from the Halide profiler, timing prefixes of the pipeline'
+            report = stageProfile(im, fusedTensor)
+        print profiling.formatReport(report, profile=='json')
+        return output, dt
 
     harris.compile_jit()
 
@@ -224,22 +441,173 @@ def computeHarris(im, indexOfSchedule, tile=256):
     dt=time.time()-t
     print indexOfSchedule, 'took ', dt, 'seconds'
 
+    return output, dt
 
+def stageProfile(im, fusedTensor=True, sigma=0.5):
+    '''per stage report of profiling.prefixProfile for the Harris pipeline,
+    every stage of harrisStageGraph computed at root'''
+    input = Image(Float(32), im)
+    width, height = input.width(), input.height()
+    graph = harrisStageGraph(sigma, fusedTensor=fusedTensor)
+    names = [g[0] for g in graph]+['Harris']
+    channels = dict((g[0], g[3]) for g in graph)
+
+    def build(name):
+        harris, stages = harrisStages(input, sigma, 0.04, 0.0, fusedTensor)
+        output = harris if name=='Harris' else stages[name]
+        placement = dict((n, 'root') for n in names[:names.index(name)])
+        applyPlacement(output, stages, placement, None)
+        return output
+
+    def sizesOf(name):
+        if channels.get(name, 1)==1: return (width, height)
+        return (width, height, channels[name])
+
+    return profiling.prefixProfile(build, names, sizesOf)
+
+def harrisCorners(im, tile=256, placement=None, fusedTensor=True, maxCorners=None, spread=True):
+    '''compute the Harris corners of im and return them as an (N, 3) float32 numpy array 
+    of (x, y, response) instead of a dense full-resolution mask.
+    The detection pipeline writes a bit-packed mask (8 pixels per byte) that is unpacked
+    and compacted with a vectorized numpy.nonzero. A second pipeline then evaluates the 
+    response R only at the N corners.
+    With maxCorners, only that many corners are kept: the best spread ones (see
+    cornerSelection.anms) if spread, otherwise the strongest ones'''
+
+    sigma=0.5
+    k = 0.04
+    threshold=0.0
 
+    input = Image(Float(32), im)
+    width, height = input.width(), input.height()
+
+    ### Detection: bit-packed mask 
+    harris, stages = harrisStages(input, sigma, k, threshold, fusedTensor)
+
+    xb, y = Var('xb'), Var('y')
+    packed = Func('packedHarris')
+    # the first pixel of a byte is its most significant bit, 
+    # which is the order used by numpy.unpackbits
+    bits = 0
+    for i in xrange(8):
+        xx = 8*xb+i
+        bits = bits + select(xx<width, select(harris[xx, y]>0.5, 128>>i, 0), 0)
+    packed[xb, y] = cast(UInt(8), bits)
+
+    # the stages are scheduled with respect to the packed output, 
+    # whose tiles are tile/8 bytes wide
+    if placement is None:
+        placement=dict((name, 'x') for name in stages 
+                       if name not in ['lumi', 'blurredLumiXX'])
+    applyPlacement(packed, stages, placement, tile, (tile+7)/8)
+
+    packed.compile_jit()
+    t=time.time()
+    output = packed.realize((width+7)/8, height)
+    mask = numpy.unpackbits(numpy.array(Image(output)), axis=1)[:, :width]
+    ys, xs = numpy.nonzero(mask)
+    dt=time.time()-t
+    print len(xs), 'corners, detection took ', dt, 'seconds'
+
+    corners = numpy.empty((len(xs), 3), numpy.float32)
+    corners[:, 0] = xs
+    corners[:, 1] = ys
+    if len(xs)==0: return corners
+
+    ### Response at the corners only
+    harris, stages = harrisStages(input, sigma, k, threshold, fusedTensor)
+    # numpy (N, 2) arrays show up as pts[coordinate, index] in Halide
+    pts = Image(Int(32), numpy.array(corners[:, :2], numpy.int32))
+    i = Var('i')
+    response = Func('cornerResponse')
+    response[i] = stages['R'][pts[0, i], pts[1, i]]
+    response.compile_jit()
+    output = response.realize(len(xs))
+    corners[:, 2] = numpy.array(Image(output))
+
+    if maxCorners is not None:
+        if spread: corners = cornerSelection.anms(corners, maxCorners)
+        else: corners = cornerSelection.topK(corners, maxCorners)
+    return corners
+
+def prefixBuilder(input, name, tile=256, fusedTensor=True, sigma=0.5, trunc=3):
+    '''build function for boundary.realizeSplit and boundary.realizeClamped of the prefix
+    of the Harris pipeline ending at name ('blurredLumi', 'R' or 'Harris'), with the tiled
+    schedule 1 of computeHarris. Returns build and the distance that the prefix reaches
+    outside the image'''
+    k = 0.04
+    threshold=0.0
+    # distance reached outside the image by each prefix, see GaussianSingleChannel
+    r1, r2 = int(sigma*trunc*2+1)/2, int(4.0*sigma*trunc*2+1)/2
+    radius={'blurredLumi': r1, 'R': r1+1+r2, 'Harris': r1+1+r2+1}[name]
+    # stages computed at the tiles of each prefix
+    upstream={'blurredLumi': [], 'R': ['blurredLumi']+tensorStages, 'Harris': ['blurredLumi', 'R']+tensorStages}
+    if not fusedTensor:
+        upstream['R']=['blurredLumi', 'ix2', 'iy2', 'ixiy', 'ix2BlurXX', 'iy2BlurXX', 'ixiyBlurXX']
+        upstream['Harris']=upstream['R']+['R']
+
+    def build(ref):
+        harris, stages = harrisStages(input, sigma, k, threshold, fusedTensor, ref)
+        output = harris if name=='Harris' else stages[name]
+        placement = dict((s, 'x') for s in upstream[name])
+        def schedule(f, width, height):
+            # a split larger than the realization would be shifted inward, out of it:
+            # the border strips are only radius pixels wide or tall
+            tileX = tile if tile<=width else width
+            tileY = tile if tile<=height else height
+            applyPlacement(f, stages, placement, tileY, tileX)
+        return output, schedule
+    return build, radius
+
+def boundarySpeedup(im, tile=256, fusedTensor=True, sigma=0.5, trunc=3):
+    '''time prefixes of the Harris pipeline (up to blurredLumi, R and the output)
+    clamped everywhere, and split by boundary.realizeSplit into an unclamped interior
+    and clamped borders. Both use the tiled schedule 1 of computeHarris.
+    Returns a dict mapping each prefix to (clamped time, split time, max difference)'''
+    input = Image(Float(32), im)
+    width, height = input.width(), input.height()
+
+    if 4.0*sigma>=iirSigma:
+        print 'the recursive blurs read whole rows, the pipeline cannot be split'
+        return {}
+
+    results={}
+    for name in ['blurredLumi', 'R', 'Harris']:
+        build, radius = prefixBuilder(input, name, tile, fusedTensor, sigma, trunc)
+        clamped, dtClamped = boundary.realizeClamped(build, width, height, input)
+        split, dtSplit = boundary.realizeSplit(build, width, height, radius, input)
+        error = numpy.max(numpy.abs(split-clamped))
+        print '%-12s clamped %.4f s, split %.4f s, speedup %.2f, max difference %g' % (
+            name, dtClamped, dtSplit, dtClamped/dtSplit, error)
+        results[name]=(dtClamped, dtSplit, error)
+    return results
 
 def main():
     #im=imageIO.imread('hk.png', 1.0)
-    im=numpy.load('Input/hk.npy')
+    im=synthetic.benchmarkImage()
     output=None
     print 
 
+    # CPU baseline
+    outputNP, dt = reference.run(reference.harris, (im,), 1)
+    print 'numpy reference took ', dt, 'seconds'
+
     for i in xrange(3):
         if i<1:
-            output=computeHarris(im, i)
+            output, dt=computeHarris(im, i)
         else:
             for tile in [64, 128, 256, 512]:
-                output=computeHarris(im, i, tile)
+                output, dt=computeHarris(im, i, tile)
+
+    if 'profile' in sys.argv or 'json' in sys.argv:
+        computeHarris(im, 1, 256, profile='json' if 'json' in sys.argv else 'table')
+
+    if 'boundary' in sys.argv:
+        boundarySpeedup(im)
 
+    if 'iir' in sys.argv:
+        for sigma in [iirSigma, 2*iirSigma]:
+            checkGaussianAccuracy(im, sigma)
 
     if False:
         outputNP=numpy.array(Image(output))
@@ -0,0 +1,88 @@
+# Summed-area table (integral image).
+
+# sat[x, y] is the sum of the input over the rectangle [0, x] x [0, y]. Once it is
+# computed, the sum over any box is four lookups, whatever the size of the box, which
+# makes box blurs, local means and adaptive thresholds cost the same for any radius.
+
+# The table is built with two scans: prefix sums along each row, then prefix sums
+# along each column. Rows are independent, so the row scans run in parallel over blocks
+# of rows and each step processes 8 rows as a vector; the column scans do the same with
+# blocks of columns. Vectorizing the row scan across rows does the job of the transpose
+# that a CPU implementation would use to make both scans run along contiguous data.
+# Sums are accumulated in double precision: in float32, the last entries of a
+# megapixel table would lose several digits.
+
+import os, sys
+from halide import *
+import time
+import numpy
+import synthetic
+
+def integralImage(func, width, height, channels=None):
+    '''double precision summed-area table of func over the width x height domain.
+    func is a Func (or Image) of x, y, c, or of x, y if channels is None,
+    and so is the result. The table is computed at root'''
+    x, y, c = Var('x'), Var('y'), Var('c')
+    xo, xi, yo, yi = Var('xo'), Var('xi'), Var('yo'), Var('yi')
+    extra = () if channels is None else (c,)
+
+    rowSum = Func('rowPrefixSum')
+    rx = RDom(1, width-1, 'rx')
+    rowSum[(x, y)+extra] = cast(Float(64), func[(x, y)+extra])
+    rowSum[(rx.x, y)+extra] += rowSum[(rx.x-1, y)+extra]
+
+    sat = Func('summedAreaTable')
+    ry = RDom(1, height-1, 'ry')
+    sat[(x, y)+extra] = rowSum[(x, y)+extra]
+    sat[(x, ry.x)+extra] += sat[(x, ry.x-1)+extra]
+
+    rowSum.compute_root().parallel(y).vectorize(x, 4)
+    rowSum.update().split(y, yo, yi, 8).reorder(yi, rx.x, yo).vectorize(yi).parallel(yo)
+    sat.compute_root().parallel(y).vectorize(x, 4)
+    sat.update().split(x, xo, xi, 8).reorder(xi, ry.x, xo).vectorize(xi).parallel(xo)
+    return sat
+
+def boxSum(sat, x0, y0, x1, y1, width, height, extra=()):
+    '''sum over the box [x0, x1] x [y0, y1] clipped to the image, from the table sat.
+    x0, y0, x1, y1 are Exprs'''
+    def S(x, y):
+        # table value, 0 left of or above the image. The select does not shrink the
+        # region that bounds inference computes: the access is clamped as well
+        return select(x<0, 0.0, select(y<0, 0.0,
+                      sat[(clamp(x, 0, width-1), clamp(y, 0, height-1))+extra]))
+    return S(x1, y1) - S(x0-1, y1) - S(x1, y0-1) + S(x0-1, y0-1)
+
+def box_mean(func, radius, width, height, channels=None):
+    '''mean of func over the (2*radius+1)^2 box around each pixel, in four lookups
+    in the summed-area table of func. radius can be an int, an Expr or a Param.
+    Near the borders, the mean is taken over the part of the box inside the image'''
+    x, y, c = Var('x'), Var('y'), Var('c')
+    extra = () if channels is None else (c,)
+    sat = integralImage(func, width, height, channels)
+
+    x0, x1 = max(x-radius, 0), min(x+radius, width-1)
+    y0, y1 = max(y-radius, 0), min(y+radius, height-1)
+    area = cast(Float(64), (x1-x0+1)*(y1-y0+1))
+
+    mean = Func('boxMean')
+    mean[(x, y)+extra] = cast(Float(32), boxSum(sat, x0, y0, x1, y1, width, height, extra)/area)
+    mean.parallel(y).vectorize(x, 4)
+    return mean
+
+def main():
+    im=synthetic.benchmarkImage()
+    input = Image(Float(32), im)
+    w, h, nc = input.width(), input.height(), input.channels()
+    radius = Param(Int(32), 'radius')
+    mean = box_mean(input, radius, w, h, nc)
+    mean.compile_jit()
+    for r in [1, 2, 5, 10, 50]:
+        radius.set(r)
+        t=time.time()
+        output = mean.realize(w, h, nc)
+        dt=time.time()-t
+        print 'radius ', r, 'took ', dt, 'seconds'
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
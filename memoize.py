@@ -0,0 +1,190 @@
+# Memoization of pipeline results on disk, keyed by the contents of their input.
+
+# Reruns of the batch scripts send the same images with the same parameters through
+# computeHarris or boxBlur. ResultCache stores the numpy output of a pipeline under a
+# key made of the pipeline name, the parameters that change its result and a hash of
+# the bytes of its input, so that a rerun only reads the output back.
+# The index of the schedule is part of the key: the schedules of Harris only agree
+# up to a small fraction of the pixels (see testSchedules), so a result computed by
+# one schedule is not returned for another.
+# contentHash is a vectorized 128-bit hash: the input is viewed as 64-bit words, each
+# word is mixed with its index by multiplications and shifts (as xxhash and murmur
+# do) and the mixed words are reduced by xor and by sum, a chunk at a time. It reads
+# the input once at memory speed, which is much faster than a realize.
+# Outputs are .npy files, returned memory-mapped. When the files take more than
+# maxBytes, the least recently used ones are removed; a hit touches its file, so the
+# order of use survives between runs. An output larger than maxBytes is not stored.
+#
+#   python memoize.py           run boxBlur and Harris twice, the second time from the cache
+#   python memoize.py clear     empty the cache first
+
+import os, sys
+from halide import *
+import time
+import hashlib
+import numpy
+import synthetic
+
+import harris
+import tutorial10_convolutionSchedule
+
+defaultCache=os.path.join('Output', 'cache')
+
+# odd 64-bit constants of xxhash64
+prime1=numpy.uint64(0x9E3779B185EBCA87)
+prime2=numpy.uint64(0xC2B2AE3D27D4EB4F)
+prime3=numpy.uint64(0x165667B19E3779F9)
+
+def contentHash(a, chunk=1<<20):
+    '''hex digest of the contents, shape and dtype of the numpy array a'''
+    a=numpy.ascontiguousarray(a)
+    raw=a.reshape(-1).view(numpy.uint8)
+    tail=len(raw)%8
+    words=raw[:len(raw)-tail].view(numpy.uint64)
+    h1, h2 = numpy.uint64(0), numpy.uint64(0)
+    # the products wrap around, as they should
+    with numpy.errstate(over='ignore'):
+        for start in xrange(0, len(words), chunk):
+            w=words[start:start+chunk]
+            m=w*prime1+numpy.arange(start, start+len(w), dtype=numpy.uint64)*prime2
+            m^=m>>numpy.uint64(29)
+            m*=prime3
+            m^=m>>numpy.uint64(32)
+            h1^=numpy.bitwise_xor.reduce(m)
+            h2+=numpy.add.reduce(m, dtype=numpy.uint64)
+    rest=hashlib.sha1(raw[len(raw)-tail:].tostring()+str(a.shape)+str(a.dtype)).hexdigest()
+    return '%016x%016x%s' % (h1, h2, rest[:16])
+
+class ResultCache:
+    '''size-bounded store of numpy outputs in directory, with least recently used eviction'''
+    def __init__(self, directory=defaultCache, maxBytes=1<<30):
+        self.directory, self.maxBytes = directory, maxBytes
+        if not os.path.exists(directory): os.makedirs(directory)
+        # key -> [bytes, time of last use], from the files already there
+        self.entries={}
+        for name in os.listdir(directory):
+            if not name.endswith('.npy'): continue
+            p=os.path.join(directory, name)
+            self.entries[name[:-4]]=[os.path.getsize(p), os.path.getmtime(p)]
+        self.hits, self.misses = 0, 0
+
+    def key(self, pipeline, im, params=()):
+        '''file name of the output of pipeline on im with the parameters params'''
+        digest=hashlib.sha1(repr(tuple(params))+contentHash(im)).hexdigest()
+        return '%s_%s' % (pipeline, digest)
+
+    def path(self, key):
+        return os.path.join(self.directory, key+'.npy')
+
+    def get(self, key):
+        '''the memory-mapped output stored under key, or None'''
+        if key not in self.entries:
+            self.misses+=1
+            return None
+        p=self.path(key)
+        try:
+            output=numpy.load(p, mmap_mode='r')
+        except (IOError, ValueError):
+            # removed or truncated by someone else
+            del self.entries[key]
+            self.misses+=1
+            return None
+        os.utime(p, None)
+        self.entries[key][1]=time.time()
+        self.hits+=1
+        return output
+
+    def put(self, key, output):
+        '''store output under key and evict what goes over maxBytes.
+        Returns False, storing nothing, if output alone is larger than maxBytes'''
+        output=numpy.asarray(output)
+        # storing it would evict everything else and then itself
+        if output.nbytes>self.maxBytes: return False
+        p=self.path(key)
+        tmp=p+'.tmp'
+        f=open(tmp, 'wb')
+        numpy.save(f, output)
+        f.close()
+        # readers never see a partial file
+        os.rename(tmp, p)
+        self.entries[key]=[os.path.getsize(p), time.time()]
+        self.evict()
+        return True
+
+    def totalBytes(self):
+        total=0
+        for size, used in self.entries.itervalues(): total+=size
+        return total
+
+    def evict(self):
+        '''remove the least recently used outputs until the store fits in maxBytes.
+        Returns the keys removed'''
+        removed=[]
+        total=self.totalBytes()
+        for key, (size, used) in sorted(self.entries.items(), key=lambda e: e[1][1]):
+            if total<=self.maxBytes: break
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            del self.entries[key]
+            total-=size
+            removed.append(key)
+        return removed
+
+    def clear(self):
+        for key in self.entries.keys():
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+        self.entries={}
+
+    def memoized(self, pipeline, run, im, params=()):
+        '''the output of run() (a numpy array) for pipeline on im, from the store if it
+        is there. Returns the output and whether it was a hit'''
+        key=self.key(pipeline, im, params)
+        output=self.get(key)
+        if output is not None: return output, True
+        output=run()
+        self.put(key, output)
+        return output, False
+
+def boxBlur(cache, im, indexOfSchedule, tileX=128, tileY=128, kernel_width=5):
+    '''tutorial10_convolutionSchedule.boxBlur through cache.
+    Returns the numpy output and the time of the call'''
+    t=time.time()
+    run=lambda: numpy.array(Image(tutorial10_convolutionSchedule.boxBlur(im, indexOfSchedule, tileX, tileY, kernel_width)[0]))
+    output, hit = cache.memoized('boxBlur', run, im, (indexOfSchedule, kernel_width))
+    dt=time.time()-t
+    print 'boxBlur', 'from the cache' if hit else 'computed', ' took ', dt, 'seconds'
+    return output, dt
+
+def computeHarris(cache, im, indexOfSchedule, tile=256, fusedTensor=True):
+    '''harris.computeHarris through cache.
+    Returns the numpy output and the time of the call'''
+    t=time.time()
+    run=lambda: numpy.array(Image(harris.computeHarris(im, indexOfSchedule, tile, fusedTensor=fusedTensor)[0]))
+    output, hit = cache.memoized('harris', run, im, (indexOfSchedule, fusedTensor))
+    dt=time.time()-t
+    print 'computeHarris', 'from the cache' if hit else 'computed', ' took ', dt, 'seconds'
+    return output, dt
+
+def main():
+    cache=ResultCache()
+    if 'clear' in sys.argv: cache.clear()
+    im=synthetic.benchmarkImage()
+
+    t=time.time()
+    contentHash(im)
+    dt=time.time()-t
+    print 'hashing ', im.nbytes, 'bytes took ', dt, 'seconds, %.2f GB/s' % (im.nbytes/dt/1e9)
+
+    for i in xrange(2):
+        boxBlur(cache, im, 5)
+        computeHarris(cache, im, 1)
+    print cache.hits, 'hits, ', cache.misses, 'misses, ', cache.totalBytes(), 'bytes in ', cache.directory
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
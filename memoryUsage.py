@@ -0,0 +1,187 @@
+# Memory used by the intermediates of a schedule.
+
+# compute_root allocates a full-frame buffer for a stage, compute_at a tile of the output
+# allocates one buffer per tile, and one per thread when the tiles run in parallel.
+# The Allocations functions predict, from the schedule alone, the bytes allocated for
+# each Func, so schedules that would go over a memory limit can be ruled out before they
+# are compiled. measureRealize measures the peak resident set of the process during a
+# realize, to check the predictions.
+
+import os, sys
+import time
+import threading
+import resource
+import numpy
+import synthetic
+
+import harris
+import scheduleSearch
+
+def harrisAllocations(width, height, placement, tile=256, sigma=0.5, fusedTensor=True, threads=1):
+    '''dict mapping each stage of harris.harrisStageGraph that is not inline to
+    (bytes per buffer, number of buffers alive at once) for a placement dict as used by
+    harris.applyPlacement. A stage at a loop level of the tiled output has its buffer
+    grown by the stencil halo of its consumers, as in scheduleSearch'''
+    graph=harris.harrisStageGraph(sigma, fusedTensor=fusedTensor)
+    halo={'Harris':(0, 0)}
+    allocations={}
+    for name, consumers, ops, channels, placements in reversed(graph):
+        halo[name]=(max([halo[c][0]+rx for c, (rx, ry) in consumers.iteritems()]),
+                    max([halo[c][1]+ry for c, (rx, ry) in consumers.iteritems()]))
+        where=placement.get(name, 'inline')
+        if where=='inline': continue
+        size=scheduleSearch.footprintBytes(where, halo[name], tile, width, height, 4*channels)
+        allocations[name]=(size, 1 if where=='root' else threads)
+    return allocations
+
+def harrisScheduleAllocations(width, height, indexOfSchedule, tile=256, fusedTensor=True):
+    '''harrisAllocations for the schedules of harris.computeHarris'''
+    names=[g[0] for g in harris.harrisStageGraph(fusedTensor=fusedTensor)]
+    if indexOfSchedule==0:
+        return harrisAllocations(width, height,
+                                 dict((n, 'root') for n in names if n!='blurredLumiXX'),
+                                 None, fusedTensor=fusedTensor)
+    return harrisAllocations(width, height,
+                             dict((n, 'x') for n in names if n not in ['lumi', 'blurredLumiXX']),
+                             tile, fusedTensor=fusedTensor)
+
+def boxBlurAllocations(width, height, channels, indexOfSchedule, tileX=128, tileY=128,
+                       kernel_width=5, threads=None):
+    '''same as harrisAllocations for the schedules of tutorial10_convolutionSchedule.boxBlur.
+    The parallel schedules (3 and 5) have one buffer per thread, threads defaulting to
+    the number of cores'''
+    if threads is None: threads=cpuCount()
+    full=width*height*channels*4
+    tileBytes=tileX*(tileY+kernel_width-1)*channels*4
+    if indexOfSchedule in [1, 6]: return {'clampedBlurx': (full, 1)}
+    if indexOfSchedule in [2, 4]: return {'clampedBlurx': (tileBytes, 1)}
+    if indexOfSchedule in [3, 5]: return {'clampedBlurx': (tileBytes, threads)}
+    return {}
+
+def cpuCount():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+def totalBytes(allocations):
+    '''bytes of all the buffers alive at once, at worst'''
+    total=0
+    for size, count in allocations.itervalues():
+        total+=size*count
+    return total
+
+def fits(allocations, limit):
+    '''False if the intermediates alone would go over limit bytes'''
+    return totalBytes(allocations)<=limit
+
+def formatAllocations(allocations):
+    L=['%-16s %14s %8s %14s' % ('Func', 'bytes', 'buffers', 'total')]
+    for name, (size, count) in sorted(allocations.items(), key=lambda e: -e[1][0]*e[1][1]):
+        L.append('%-16s %14d %8d %14d' % (name, size, count, size*count))
+    L.append('%-16s %14s %8s %14d' % ('all', '', '', totalBytes(allocations)))
+    return '\n'.join(L)
+
+def statusBytes(field):
+    '''a field of /proc/self/status in bytes, None if unavailable'''
+    try:
+        f=open('/proc/self/status')
+        lines=f.readlines()
+        f.close()
+    except IOError:
+        return None
+    for line in lines:
+        if line.startswith(field+':'):
+            return int(line.split()[1])*1024
+    return None
+
+def residentBytes():
+    return statusBytes('VmRSS')
+
+def resetPeak():
+    '''reset the peak resident set of the process (Linux 4.0 and later).
+    Returns False if it cannot be reset'''
+    try:
+        f=open('/proc/self/clear_refs', 'w')
+        f.write('5')
+        f.close()
+        return True
+    except IOError:
+        return False
+
+class RSSSampler(threading.Thread):
+    '''samples the resident set every interval seconds until stopped and keeps the peak.
+    Used when the kernel peak cannot be reset'''
+    def __init__(self, interval=0.001):
+        threading.Thread.__init__(self)
+        self.daemon=True
+        self.interval=interval
+        self.peak=residentBytes() or 0
+        self.done=threading.Event()
+    def run(self):
+        while not self.done.is_set():
+            rss=residentBytes() or 0
+            if rss>self.peak: self.peak=rss
+            time.sleep(self.interval)
+    def stop(self):
+        self.done.set()
+        self.join()
+        return self.peak
+
+def measureRealize(run):
+    '''call run() and return (result, peak resident bytes during the call,
+    growth of the peak over the resident set before the call)'''
+    before=residentBytes()
+    if before is None:
+        # no /proc: only the peak over the whole life of the process is known
+        result=run()
+        peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+        return result, peak, 0
+    if resetPeak():
+        result=run()
+        peak=statusBytes('VmHWM')
+    else:
+        sampler=RSSSampler()
+        sampler.start()
+        try:
+            result=run()
+        finally:
+            peak=sampler.stop()
+    return result, peak, peak-before
+
+def compiled(build, sizes):
+    '''compile the Func returned by build() and return a function that realizes it.
+    The JIT compiler allocates far more than the buffers of a pipeline, so it must run
+    before the measure'''
+    f=build()
+    f.compile_jit()
+    return lambda: f.realize(*sizes)
+
+def main():
+    import tutorial10_convolutionSchedule
+    from halide import Image, Float
+    im=synthetic.benchmarkImage()
+    height, width, channels = im.shape
+    input=Image(Float(32), im)
+    # optional limit in megabytes
+    limit=float(sys.argv[1])*2**20 if len(sys.argv)>1 else None
+
+    runs=[('harris %d' % i, harrisScheduleAllocations(width, height, i),
+           lambda i=i: harris.harrisFunc(input, i), (width, height)) for i in xrange(3)]
+    runs+=[('boxBlur %d' % i, boxBlurAllocations(width, height, channels, i, 256, 256),
+            lambda i=i: tutorial10_convolutionSchedule.boxBlurFunc(input, i, 256, 256),
+            (width, height, channels)) for i in xrange(7)]
+
+    for name, allocations, build, sizes in runs:
+        print '\n', name
+        print formatAllocations(allocations)
+        if limit is not None and not fits(allocations, limit):
+            print 'over the limit of ', limit, 'bytes, not run'
+            continue
+        result, peak, growth = measureRealize(compiled(build, sizes))
+        print 'peak resident set ', peak, 'bytes, ', growth, 'more than before realize'
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
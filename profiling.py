@@ -0,0 +1,121 @@
+# Per-Func profiling of Halide pipelines.
+
+# A single wall-clock time per schedule does not say which Func is the bottleneck.
+# realizeProfiled compiles the pipeline for a target with Halide's 'profile' feature,
+# which samples the Func being computed by each thread and reports, for every Func,
+# its share of the time and the memory it allocated. The runtime prints this report
+# on stderr, so it is captured and parsed into a list of entries
+#     {'name': ..., 'time': seconds, 'percent': ..., 'bytes': peak allocation}
+# sorted from the most to the least expensive Func.
+# When the runtime prints nothing (bindings or runtime built without the profiler),
+# prefixProfile gives the same entries by timing prefixes of the pipeline, every stage
+# computed at root: a stage costs the difference between the prefix that ends with it
+# and the previous one, and allocates a full-frame buffer.
+
+import os, sys
+from halide import *
+import time
+import re
+import json
+import tempfile
+import numpy
+
+def profilingTarget():
+    '''JIT target string with the profile feature, from HL_JIT_TARGET or the host'''
+    target = os.environ.get('HL_JIT_TARGET', 'host')
+    if 'profile' not in target.split('-'): target += '-profile'
+    return target
+
+def compileProfiled(f):
+    '''compile_jit f for the profiling target'''
+    old = os.environ.get('HL_JIT_TARGET')
+    os.environ['HL_JIT_TARGET'] = profilingTarget()
+    try:
+        f.compile_jit()
+    finally:
+        if old is None: del os.environ['HL_JIT_TARGET']
+        else: os.environ['HL_JIT_TARGET'] = old
+
+def captureStderr(run):
+    '''call run() with the file descriptor 2 redirected to a temporary file, so that
+    the output of the Halide runtime is captured as well. Returns (result, text)'''
+    sys.stderr.flush()
+    saved = os.dup(2)
+    tmp = tempfile.TemporaryFile()
+    os.dup2(tmp.fileno(), 2)
+    try:
+        result = run()
+    finally:
+        sys.stderr.flush()
+        os.dup2(saved, 2)
+        os.close(saved)
+    tmp.seek(0)
+    text = tmp.read()
+    tmp.close()
+    return result, text
+
+# one line per Func in the report of the profiler, e.g.
+#   blur_x:  0.354ms  (25%)  threads: 7.000  peak: 1048576  num: 1  avg: 1048576
+funcLine = re.compile(r'^\s+([^\s:]+):\s+([0-9.]+)ms\s+\(([0-9.]+)%\)(.*)$')
+peakField = re.compile(r'peak:\s*([0-9]+)')
+
+def parseReport(text):
+    '''entries of a profiler report, sorted by decreasing time. Empty if text holds none'''
+    report = []
+    for line in text.splitlines():
+        m = funcLine.match(line)
+        if m is None: continue
+        peak = peakField.search(m.group(4))
+        report.append({'name': m.group(1), 'time': float(m.group(2))/1000.0,
+                       'percent': float(m.group(3)),
+                       'bytes': int(peak.group(1)) if peak else 0})
+    return sortReport(report)
+
+def sortReport(report):
+    return sorted(report, key=lambda e: (-e['time'], e['name']))
+
+def realizeProfiled(f, sizes):
+    '''compile f with the profiler, realize it over sizes and return (output, dt, report).
+    Text printed by the runtime that is not part of a report is passed on to stderr'''
+    compileProfiled(f)
+    def run():
+        t=time.time()
+        output = f.realize(*sizes)
+        return output, time.time()-t
+    (output, dt), text = captureStderr(run)
+    report = parseReport(text)
+    if not report: sys.stderr.write(text)
+    return output, dt, report
+
+def prefixProfile(build, names, sizesOf):
+    '''profile without the profiler. build(name) returns the Func computing the prefix of
+    the pipeline that ends with the stage name, all the earlier stages computed at root,
+    names lists the stages from producers to the output and sizesOf(name) gives the
+    realization sizes of a stage. Returns a report like parseReport'''
+    report = []
+    previous = 0.0
+    total = 0.0
+    for name in names:
+        f = build(name)
+        f.compile_jit()
+        t=time.time()
+        f.realize(*sizesOf(name))
+        dt=time.time()-t
+        # the builtin max is hidden by the one of halide
+        stageTime = dt-previous if dt>previous else 0.0
+        report.append({'name': name, 'time': stageTime, 'percent': 0.0,
+                       'bytes': 4*int(numpy.prod(sizesOf(name)))})
+        previous = dt
+        total += stageTime
+    if total==0.0: total = 1.0
+    for e in report:
+        e['percent'] = 100.0*e['time']/total
+    return sortReport(report)
+
+def formatReport(report, asJson=False):
+    '''the report as a table sorted by time, or as JSON'''
+    if asJson: return json.dumps(report, indent=1)
+    L = ['%-24s %10s %8s %14s' % ('Func', 'ms', '%', 'bytes')]
+    for e in report:
+        L.append('%-24s %10.3f %8.1f %14d' % (e['name'], 1000*e['time'], e['percent'], e['bytes']))
+    return '\n'.join(L)
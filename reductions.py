@@ -0,0 +1,179 @@
+# Parallel reductions over images.
+
+# The mySum/myAverage reductions of tutorial8_reduction iterate their RDom over the
+# whole image in a single serial loop. Here the image is cut into strips of rows:
+# each strip is reduced on its own core into a vector of partial sums, and the partial
+# sums of the strips are combined pairwise at the end.
+# The 8-bit histogram follows the same plan: each strip fills its own private
+# 256-bin histogram, and the private histograms are added up at the end.
+
+import os, sys
+from halide import *
+import time
+import numpy
+import synthetic
+
+#Python Imaging Library will be used for IO
+import imageIO
+
+def parallel_sum(func, width, height, channels=None, stripHeight=16, vectorWidth=8):
+    '''Func of c holding the sum of func over the width x height domain.
+    func is a Func of x, y, c with the given number of channels,
+    or a Func of x, y if channels is None (then the result has a single channel).
+
+    First level: the rows are grouped in strips of stripHeight rows, and each strip is
+    reduced into vectorWidth partial sums (one per vector lane, columns x with the same
+    x%vectorWidth share a lane). Strips run in parallel, lanes are vectorized.
+    Second level: the partial sums of the strips, each of at most
+    width*stripHeight/vectorWidth values, are added pairwise in a tree, neighbouring
+    strips first, and the vectorWidth lanes of the root are added in double precision.
+    The rounding error of the float32 sums then grows with the length of a strip and
+    the log of the number of strips, instead of the number of pixels of a flat sum.
+    width and height are python ints: the tree has one root Func per level'''
+
+    x, y, c = Var('x'), Var('y'), Var('c')
+    xi, yo = Var('xi'), Var('yo')
+
+    if channels is None:
+        input = Func('sumInput')
+        input[x, y, c] = func[x, y]
+        channels = 1
+    else:
+        input = func
+
+    r = RDom(0, (width+vectorWidth-1)/vectorWidth, 0, stripHeight, 'r')
+    xx = r.x*vectorWidth+xi
+    yy = yo*stripHeight+r.y
+    partial = Func('partialSums')
+    partial[xi, yo, c] = 0.0
+    # the select does not shrink the region read from input: the coordinates past the
+    # edge are clamped to it, and their values are not counted
+    partial[xi, yo, c] += select(xx<width, select(yy<height,
+                                 input[min(xx, width-1), min(yy, height-1), c], 0.0), 0.0)
+
+    partial.compute_root()
+    partial.update().reorder(xi, r.x, r.y, yo).vectorize(xi, vectorWidth).parallel(yo)
+
+    # pairwise tree over the strips, each level adds neighbouring pairs
+    level, count = partial, (height+stripHeight-1)/stripHeight
+    while count>1:
+        pairs = Func('pairwiseSums')
+        pairs[xi, yo, c] = level[xi, 2*yo, c] + select(2*yo+1<count,
+                                                       level[xi, min(2*yo+1, count-1), c], 0.0)
+        pairs.compute_root().vectorize(xi, vectorWidth)
+        level, count = pairs, (count+1)/2
+
+    rr = RDom(0, vectorWidth, 'rr')
+    total = Func('sum')
+    total[c] = cast(Float(64), 0.0)
+    total[c] += cast(Float(64), level[rr.x, 0, c])
+    return total
+
+def parallel_mean(func, width, height, channels=None, stripHeight=16, vectorWidth=8):
+    '''Func of c holding the mean of func over the width x height domain, see parallel_sum'''
+    c = Var('c')
+    total = parallel_sum(func, width, height, channels, stripHeight, vectorWidth)
+    mean = Func('mean')
+    mean[c] = total[c]/(width*height)
+    return mean
+
+def quantize(value):
+    '''8-bit bin of a float value in [0, 1], as imageIO returns them'''
+    return clamp(cast(Int(32), value*255.0+0.5), 0, 255)
+
+def histogram(func, width, height, isFloat=True, stripHeight=64):
+    '''Func of b holding the 256-bin histogram of the single-channel func over the 
+    width x height domain. func holds either floats in [0, 1] (isFloat) that get quantized,
+    or 8-bit values.
+    Each strip of stripHeight rows is counted into its own private histogram, in parallel,
+    so that threads never write to the same bins. The private histograms are then merged'''
+
+    x, y, b, s = Var('x'), Var('y'), Var('b'), Var('s')
+
+    strips = (height+stripHeight-1)/stripHeight
+    r = RDom(0, width, 0, stripHeight, 'r')
+    yy = min(s*stripHeight+r.y, height-1)
+    value = func[r.x, yy]
+    bucket = quantize(value) if isFloat else cast(Int(32), value)
+
+    private = Func('privateHistograms')
+    private[b, s] = 0
+    # rows past the end of the last strip are clamped to the last row and not counted
+    private[bucket, s] += select(s*stripHeight+r.y<height, 1, 0)
+
+    private.compute_root().vectorize(b, 8)
+    private.update().parallel(s)
+
+    rs = RDom(0, strips, 'rs')
+    hist = Func('histogram')
+    hist[b] = 0
+    hist[b] += private[b, rs.x]
+    hist.update().vectorize(b, 8)
+    return hist
+
+def benchmarkHistogram(im, numTimes=5):
+    '''histogram of the green channel of the float image im, with Halide and numpy.bincount.
+    Returns both histograms and their times. The numpy time includes the quantization'''
+    input = Image(Float(32), im)
+    x, y = Var('x'), Var('y')
+    green = Func('green')
+    green[x, y] = input[x, y, 1]
+    hist = histogram(green, input.width(), input.height())
+    hist.compile_jit()
+    t=time.time()
+    for i in xrange(numTimes):
+        output = hist.realize(256)
+    dt=(time.time()-t)/numTimes
+    halideHist = numpy.array(Image(output))
+    print 'Halide histogram took ', dt, 'seconds'
+
+    t=time.time()
+    for i in xrange(numTimes):
+        q = numpy.clip(numpy.floor(im[:, :, 1]*255.0+0.5), 0, 255).astype(numpy.intp)
+        numpyHist = numpy.bincount(q.ravel(), minlength=256)
+    dtNumpy=(time.time()-t)/numTimes
+    print 'numpy.bincount took ', dtNumpy, 'seconds'
+    print 'speedup: %.2f' % (dtNumpy/dt)
+    if not numpy.array_equal(halideHist, numpyHist):
+        print 'histograms differ in ', numpy.sum(halideHist!=numpyHist), 'bins'
+    return halideHist, dt, numpyHist, dtNumpy
+
+def realizeReduction(f, channels=1, numTimes=5):
+    '''compile and realize a Func of c, return the numpy result and the time per realize'''
+    f.compile_jit()
+    t=time.time()
+    for i in xrange(numTimes):
+        output = f.realize(channels)
+    dt=(time.time()-t)/numTimes
+    return numpy.array(Image(output)), dt
+
+def main():
+    im=synthetic.benchmarkImage()
+    input = Image(Float(32), im)
+    w, h, nc = input.width(), input.height(), input.channels()
+
+    # serial reference, as in tutorial8_reduction
+    c = Var('c')
+    r = RDom(0, w, 0, h, 'r')
+    mySum = Func('mySum')
+    mySum[c] = 0.0
+    mySum[c] += input[r.x, r.y, c]
+    serial, dt = realizeReduction(mySum, nc)
+    print 'serial sum  ', serial, 'took ', dt, 'seconds'
+
+    parallel, dt = realizeReduction(parallel_sum(input, w, h, nc), nc)
+    print 'parallel sum', parallel, 'took ', dt, 'seconds'
+
+    mean, dt = realizeReduction(parallel_mean(input, w, h, nc), nc)
+    print 'parallel mean', mean, 'took ', dt, 'seconds'
+
+    exact = numpy.sum(numpy.asarray(im, numpy.float64), axis=(0, 1))
+    print 'relative error of the serial sum:  ', numpy.abs(serial-exact)/exact
+    print 'relative error of the parallel sum:', numpy.abs(parallel-exact)/exact
+
+    print '\n8-bit histogram'
+    benchmarkHistogram(im)
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
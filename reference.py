@@ -0,0 +1,200 @@
+# Vectorized numpy versions of the pipelines of the tutorials.
+
+# The "equivalent python code" of the tutorials loops over every pixel and is never run.
+# These functions compute the same thing as the Halide pipelines, with whole-array numpy
+# operations, so that they are fast enough to check every output (see testSchedules) and
+# to give the CPU baseline of the benchmarks.
+# Images are numpy arrays indexed [y, x] or [y, x, c] like the ones of imageIO and
+# numpy.array(Image(output)). Clamping to the edge is numpy.pad with mode 'edge'.
+# Computations are done in float32 like the Halide versions.
+
+import os, sys
+import time
+import numpy
+import synthetic
+
+def pad(im, x0, x1, y0, y1):
+    '''im extended by x0 columns on the left and x1 on the right, y0 rows above and
+    y1 below, the new pixels repeating the edge (the clamped Funcs of the tutorials)'''
+    return numpy.pad(im, [(y0, y1), (x0, x1)]+[(0, 0)]*(im.ndim-2), 'edge')
+
+def gradient(im):
+    '''tutorial3: forward differences, the output is one pixel smaller in x and y'''
+    im=numpy.asarray(im, numpy.float32)
+    gx=im[:-1, 1:]-im[:-1, :-1]
+    gy=im[1:, :-1]-im[:-1, :-1]
+    return numpy.sqrt(gx**2+gy**2)
+
+def clampedGradient(im):
+    '''tutorial4: backward differences with the image clamped to its edges'''
+    p=pad(numpy.asarray(im, numpy.float32), 1, 0, 1, 0)
+    gx=p[1:, 1:]-p[1:, :-1]
+    gy=p[1:, 1:]-p[:-1, 1:]
+    return numpy.sqrt(gx**2+gy**2)
+
+def box3x3(im):
+    '''tutorial6: separable 3x3 box, not centered, the output is two pixels smaller'''
+    im=numpy.asarray(im, numpy.float32)
+    blur_x=(im[:, :-2]+im[:, 1:-1]+im[:, 2:])/3
+    return (blur_x[:-2]+blur_x[1:-1]+blur_x[2:])/3
+
+def separable(im, horizontal, vertical):
+    '''correlation by the outer product of the vertical and horizontal taps, centered
+    at len/2, with the input clamped and the horizontal pass clamped like in tutorial10'''
+    kw, kh = len(horizontal), len(vertical)
+    p=pad(numpy.asarray(im, numpy.float32), kw/2, kw-1-kw/2, 0, 0)
+    width=p.shape[1]-kw+1
+    blur_x=numpy.zeros(p[:, :width].shape, numpy.float32)
+    for i in xrange(kw):
+        blur_x+=p[:, i:i+width]*numpy.float32(horizontal[i])
+    p=pad(blur_x, 0, 0, kh/2, kh-1-kh/2)
+    height=p.shape[0]-kh+1
+    out=numpy.zeros(blur_x.shape, numpy.float32)
+    for i in xrange(kh):
+        out+=p[i:i+height]*numpy.float32(vertical[i])
+    return out
+
+def boxBlur(im, kernel_width=5):
+    '''tutorial10_convolutionSchedule.boxBlur, with any of its schedules'''
+    ones=numpy.ones(kernel_width)
+    return separable(im, ones, ones)/numpy.float32(kernel_width**2)
+
+def box5x5(im):
+    return boxBlur(im, 5)
+
+def convolve(im, kernel):
+    '''convolution.convolve: correlation by the 2D kernel, centered, image clamped'''
+    kh, kw = numpy.shape(kernel)
+    p=pad(numpy.asarray(im, numpy.float32), kw/2, kw-1-kw/2, kh/2, kh-1-kh/2)
+    height, width = p.shape[0]-kh+1, p.shape[1]-kw+1
+    out=numpy.zeros(p[:height, :width].shape, numpy.float32)
+    for dy in xrange(kh):
+        for dx in xrange(kw):
+            out+=p[dy:dy+height, dx:dx+width]*numpy.float32(kernel[dy, dx])
+    return out
+
+def channelSum(im):
+    '''tutorial8 mySum and reductions.parallel_sum, in double precision'''
+    return numpy.sum(numpy.asarray(im, numpy.float64), axis=(0, 1))
+
+def channelMean(im):
+    '''tutorial8 myAverage and reductions.parallel_mean'''
+    return channelSum(im)/(im.shape[0]*im.shape[1])
+
+def histogram(channel, isFloat=True):
+    '''reductions.histogram of a single channel'''
+    if isFloat:
+        channel=numpy.clip(numpy.floor(channel*255.0+0.5), 0, 255)
+    return numpy.bincount(channel.astype(numpy.intp).ravel(), minlength=256)
+
+def boxMean(im, radius):
+    '''integralImage.box_mean: mean over the part of the (2*radius+1)^2 box around each
+    pixel that is inside the image, from cumulative sums in double precision'''
+    im=numpy.asarray(im, numpy.float64)
+    h, w = im.shape[0], im.shape[1]
+    sat=numpy.zeros((h+1, w+1)+im.shape[2:])
+    sat[1:, 1:]=numpy.cumsum(numpy.cumsum(im, axis=0), axis=1)
+    y, x = numpy.arange(h), numpy.arange(w)
+    y0, y1 = numpy.maximum(y-radius, 0), numpy.minimum(y+radius, h-1)+1
+    x0, x1 = numpy.maximum(x-radius, 0), numpy.minimum(x+radius, w-1)+1
+    s=sat[y1][:, x1]-sat[y0][:, x1]-sat[y1][:, x0]+sat[y0][:, x0]
+    area=((y1-y0)[:, None]*(x1-x0)[None, :]).reshape((h, w)+(1,)*(im.ndim-2))
+    return (s/area).astype(numpy.float32)
+
+def luminance(im):
+    '''harris.luminance'''
+    im=numpy.asarray(im, numpy.float32)
+    return numpy.float32(0.3)*im[:, :, 0]+numpy.float32(0.6)*im[:, :, 1]+numpy.float32(0.1)*im[:, :, 2]
+
+def sobelX(lumi):
+    '''harris.SobelX, clamped'''
+    p=pad(numpy.asarray(lumi, numpy.float32), 1, 1, 1, 1)
+    c=lambda dx, dy: p[1+dy:p.shape[0]-1+dy, 1+dx:p.shape[1]-1+dx]
+    return (-c(-1, -1)+c(1, -1) - 2*c(-1, 0)+2*c(1, 0) - c(-1, 1)+c(1, 1))/4.0
+
+def sobelY(lumi):
+    '''harris.SobelY, clamped'''
+    p=pad(numpy.asarray(lumi, numpy.float32), 1, 1, 1, 1)
+    c=lambda dx, dy: p[1+dy:p.shape[0]-1+dy, 1+dx:p.shape[1]-1+dx]
+    return (-c(-1, -1)+c(-1, 1) - 2*c(0, -1)+2*c(0, 1) - c(1, -1)+c(1, 1))/4.0
+
+def sobelMagnitude(lumi):
+    '''a11.sobel: magnitude of the clamped Sobel gradient'''
+    return numpy.sqrt(sobelX(lumi)**2+sobelY(lumi)**2)
+
+def gaussianKernel(sigma, trunc=3):
+    '''taps of harris.GaussianSingleChannel, not normalized'''
+    kernel_width=int(sigma*trunc*2+1)
+    i=numpy.arange(kernel_width)
+    return numpy.exp(-(i-kernel_width/2.0)**2/(2.0*sigma**2))
+
+def gaussianIIR(im, sigma):
+    '''harris.GaussianIIR: the four recursions, each vectorized across the other axis'''
+    # the coefficients come from harris, which needs halide; they are recomputed here
+    if sigma>=2.5: q=0.98711*sigma-0.96330
+    else: q=3.97156-4.14554*numpy.sqrt(1-0.26891*sigma)
+    b0=1.57825+2.44413*q+1.4281*q**2+0.422205*q**3
+    b1=2.44413*q+2.85619*q**2+1.26661*q**3
+    b2=-(1.4281*q**2+1.26661*q**3)
+    b3=0.422205*q**3
+    B, a = 1-(b1+b2+b3)/b0, [b1/b0, b2/b0, b3/b0]
+    out=numpy.array(im, numpy.float32)
+    for axis in [1, 0]:
+        out=numpy.swapaxes(out, 0, axis).copy()
+        n=out.shape[0]
+        for order in [xrange(n), xrange(n-1, -1, -1)]:
+            step=1 if order[0]==0 else -1
+            source=out.copy()
+            for i in order:
+                prev=[out[min(max(i-step*k, 0), n-1)] for k in (1, 2, 3)]
+                out[i]=B*source[i]+a[0]*prev[0]+a[1]*prev[1]+a[2]*prev[2]
+        out=numpy.swapaxes(out, 0, axis)
+    return out
+
+def gaussian(im, sigma, trunc=3, method=None):
+    '''harris.GaussianSingleChannel (or GaussianStructureTensor, per channel)'''
+    if method is None: method='iir' if sigma>=3.0 else 'fir'
+    if method=='iir': return gaussianIIR(im, sigma)
+    k=gaussianKernel(sigma, trunc)
+    return separable(im, k, k)/numpy.float32(2*3.14159*sigma**2)
+
+def harrisResponse(im, sigma=0.5, k=0.04):
+    '''the stage R of harris.harrisStages'''
+    blurred=gaussian(luminance(im), sigma)
+    gx, gy = sobelX(blurred), sobelY(blurred)
+    ix2=gaussian(gx**2, 4.0*sigma)
+    iy2=gaussian(gy**2, 4.0*sigma)
+    ixiy=gaussian(gx*gy, 4.0*sigma)
+    return ix2*iy2-ixiy**2-numpy.float32(k)*(ix2+iy2)**2
+
+def harris(im, sigma=0.5, k=0.04, threshold=0.0):
+    '''harris.computeHarris: 1 at the local maxima of R (clamped, strictly greater
+    than its 4 neighbors) above threshold, 0 elsewhere'''
+    R=harrisResponse(im, sigma, k)
+    p=pad(R, 1, 1, 1, 1)
+    h, w = R.shape
+    maxi=((R>p[1:h+1, 0:w])&(R>p[1:h+1, 2:w+2])&(R>p[0:h, 1:w+1])&(R>p[2:h+2, 1:w+1]))
+    return (maxi&(R>threshold)).astype(numpy.float32)
+
+def run(f, args, numTimes=5):
+    '''call f(*args) numTimes, return the output and the time per call'''
+    t=time.time()
+    for i in xrange(numTimes):
+        output=f(*args)
+    dt=(time.time()-t)/numTimes
+    return output, dt
+
+def main():
+    im=synthetic.benchmarkImage()
+    lumi=luminance(im)
+    for name, f, args in [('gradient', gradient, (im,)), ('clampedGradient', clampedGradient, (im,)),
+                          ('box3x3', box3x3, (lumi,)), ('box5x5', box5x5, (im,)),
+                          ('convolve 5x5', convolve, (im, numpy.random.rand(5, 5))),
+                          ('channelSum', channelSum, (im,)), ('histogram', histogram, (im[:, :, 1],)),
+                          ('sobelMagnitude', sobelMagnitude, (lumi,)), ('harris', harris, (im,))]:
+        output, dt = run(f, args, 3)
+        print '%-16s took ' % name, dt, 'seconds'
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
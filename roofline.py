@@ -0,0 +1,172 @@
+# Image size sweep with memory bandwidth and roofline reporting.
+
+# runAndMeasure prints ms per megapixel for a single image size. Here every schedule runs
+# on square images from sizes whose buffers fit in L2 up to sizes several times larger
+# than the last level cache, and its time is compared with the roofline of the machine:
+#     attainable flops = min(peak flops, arithmetic intensity * bandwidth)
+# where the bandwidth is measured by a STREAM-like triad a = b + 3*c and the peak by a
+# register-resident chain of multiply-adds, both as small Halide pipelines.
+# The flops and the DRAM bytes per pixel of a schedule are estimated from the schedule:
+# root intermediates are written and read back from memory, intermediates computed
+# per tile are assumed to stay in cache, and the input is read once per evaluation
+# of its tile (halo included). The fraction of the roofline reached says whether a
+# schedule is limited by memory traffic or by computation, and how far it is from it.
+
+import os, sys
+from halide import *
+import time
+import numpy
+import synthetic
+
+import harris
+import scheduleSearch
+import cacheSimulator
+import tutorial10_convolutionSchedule
+
+def streamBandwidth(n=None, numTimes=5):
+    '''bytes per second of the parallel triad a = b + 3*c on float32 arrays of n elements,
+    by default 4 times the size of the last level cache (at most 256 MB per array).
+    Counts 12 bytes per element, as STREAM does'''
+    if n is None:
+        llc=cacheSimulator.hostLevels()[-1].size
+        # the builtin min is hidden by the one of halide
+        n=llc if llc<(1<<26) else 1<<26
+    width=1024
+    rows=(n+width-1)/width
+    b=Image(Float(32), numpy.ones((rows, width), numpy.float32))
+    c=Image(Float(32), numpy.ones((rows, width), numpy.float32))
+    x, y, yo, yi = Var('x'), Var('y'), Var('yo'), Var('yi')
+    a=Func('triad')
+    a[x, y]=b[x, y]+3.0*c[x, y]
+    a.split(y, yo, yi, 64).parallel(yo).vectorize(x, 8)
+    a.compile_jit()
+    L=[]
+    for i in xrange(numTimes):
+        t=time.time()
+        a.realize(width, rows)
+        L.append(time.time()-t)
+    return 12.0*width*rows/numpy.min(L)
+
+def peakFlops(chain=64, numTimes=5):
+    '''floating point operations per second of independent chains of multiply-adds,
+    vectorized and parallel, writing one float every 2*chain operations'''
+    width, height = 1024, 1024
+    x, y, yo, yi = Var('x'), Var('y'), Var('yo'), Var('yi')
+    e=cast(Float(32), x+y)
+    for i in xrange(chain):
+        e=e*0.999+0.001
+    f=Func('multiplyAdds')
+    f[x, y]=e
+    # vectors of 32 lanes keep several independent chains in flight
+    f.split(y, yo, yi, 16).parallel(yo).vectorize(x, 32)
+    f.compile_jit()
+    L=[]
+    for i in xrange(numTimes):
+        t=time.time()
+        f.realize(width, height)
+        L.append(time.time()-t)
+    return 2.0*chain*width*height/numpy.min(L)
+
+def boxBlurModel(indexOfSchedule, channels=3, tileX=256, tileY=256, kernel_width=5):
+    '''estimated (flops, DRAM traffic) per output pixel of tutorial10 boxBlur'''
+    k=kernel_width
+    # the input and the output
+    traffic=2*4*channels
+    if indexOfSchedule==0:
+        # blur_x inline: recomputed for each of the k taps of blur_y
+        flops=k*k+k+1
+    elif indexOfSchedule in [1, 6]:
+        flops=2*k+1
+        traffic+=2*4*channels
+    else:
+        # blur_x per tile, with k-1 extra rows
+        recompute=(tileY+k-1.0)/tileY
+        flops=k*recompute+k+1
+        traffic+=4*channels*(recompute-1)
+    return flops*channels, traffic
+
+def harrisModel(placement, tile=256, sigma=0.5):
+    '''estimated (flops, DRAM traffic) per output pixel of the Harris pipeline for a
+    placement dict, with the costs and evaluation counts of scheduleSearch'''
+    graph=harris.harrisStageGraph(sigma)
+    evals, halo = {'Harris':1.0}, {'Harris':(0, 0)}
+    # local max and threshold, the RGB input and the output
+    flops, traffic = 6.0, 12.0+4.0
+    for name, consumers, ops, channels, placements in reversed(graph):
+        h=(numpy.max([halo[c][0]+rx for c, (rx, ry) in consumers.iteritems()]),
+           numpy.max([halo[c][1]+ry for c, (rx, ry) in consumers.iteritems()]))
+        where=placement.get(name, 'inline')
+        e=scheduleSearch.evaluationsPerPixel(where, [(evals[c], consumers[c]) for c in consumers], h, tile)
+        evals[name], halo[name] = e, h
+        flops+=e*ops
+        if where=='root': traffic+=2*4*channels
+    return flops, traffic
+
+def harrisScheduleModel(indexOfSchedule, tile=256):
+    names=[g[0] for g in harris.harrisStageGraph()]
+    if indexOfSchedule==0:
+        return harrisModel(dict((n, 'root') for n in names if n!='blurredLumiXX'), tile)
+    return harrisModel(dict((n, 'x') for n in names if n not in ['lumi', 'blurredLumiXX']), tile)
+
+def sweepSizes(levels=None):
+    '''square image widths from a size whose input and output fit in half of L2
+    to one whose input alone is 4 times the last level cache'''
+    if levels is None: levels=cacheSimulator.hostLevels()
+    l2=levels[1].size if len(levels)>1 else levels[0].size
+    width=64
+    while 2*12*(2*width)**2<=l2: width*=2
+    sizes=[width]
+    while 12*width**2<4*levels[-1].size and width<16384:
+        width*=2
+        sizes.append(width)
+    return sizes
+
+def pipelines():
+    '''(name, run, model) where run(im) returns the time of a realize and model()
+    the (flops, traffic) per pixel'''
+    L=[]
+    for i in xrange(7):
+        L.append(('boxBlur %d' % i,
+                  lambda im, i=i: tutorial10_convolutionSchedule.boxBlur(im, i, 256, 256)[1]/5,
+                  lambda i=i: boxBlurModel(i)))
+    for i in xrange(3):
+        L.append(('harris %d' % i, lambda im, i=i: harris.computeHarris(im, i)[1],
+                  lambda i=i: harrisScheduleModel(i)))
+    return L
+
+def roofline(flops, traffic, dt, pixels, peak, bandwidth):
+    '''achieved flops, achieved bandwidth, fraction of the attainable flops and the
+    bound ('memory' or 'compute') of a run'''
+    intensity=flops/traffic
+    attainable=peak if intensity*bandwidth>=peak else intensity*bandwidth
+    achieved=flops*pixels/dt
+    return achieved, traffic*pixels/dt, achieved/attainable, 'compute' if intensity*bandwidth>=peak else 'memory'
+
+def sweep(sizes=None):
+    bandwidth=streamBandwidth()
+    peak=peakFlops()
+    print 'triad bandwidth %.2f GB/s, peak %.2f GFLOP/s, ridge at %.2f flops/byte' % (
+        bandwidth/1e9, peak/1e9, peak/bandwidth)
+    if sizes is None: sizes=sweepSizes()
+    results=[]
+    print '\n%6s %-10s %9s %9s %9s %10s %9s %8s' % ('width', 'schedule', 'ms/Mpix', 'GB/s',
+                                                  'GFLOP/s', 'flops/B', 'roofline', 'bound')
+    for width in sizes:
+        im=numpy.array(synthetic.image('pink', width, width))
+        pixels=width*width
+        for name, run, model in pipelines():
+            dt=run(im)
+            flops, traffic = model()
+            achieved, moved, fraction, bound = roofline(flops, traffic, dt, pixels, peak, bandwidth)
+            results.append((width, name, dt, achieved, moved, fraction, bound))
+            print '%6d %-10s %9.3f %9.2f %9.2f %10.2f %8.1f%% %8s' % (width, name, dt/pixels*1e9,
+                  moved/1e9, achieved/1e9, flops/traffic, 100*fraction, bound)
+    return results
+
+def main():
+    sizes=[int(a) for a in sys.argv[1:]] or None
+    sweep(sizes)
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# Schedule-space search for the Harris pipeline.
+
+# Every producer listed by harris.harrisStageGraph can be computed inline, at root,
+# or at one of the loop levels of the tiled output: once per row of tiles (y),
+# once per tile (x) or once per scanline inside a tile (yi).
+# We enumerate all the legal combinations, rank them with a simple footprint and
+# recompute cost model, benchmark the most promising ones, and print the winner
+# as Python code that can be pasted into a schedule.
+
+import os, sys
+import time
+import numpy
+import synthetic
+import heapq
+
+import harris
+
+PLACEMENTS=['inline', 'root', 'y', 'x', 'yi']
+# nesting depth of each placement. The output pixel itself is the deepest level
+DEPTH={'root':0, 'y':1, 'x':2, 'yi':3}
+OUTPUT_DEPTH=4
+
+def evaluationsPerPixel(where, consumerEvals, halo, tile):
+    '''number of evaluations of a stage per output pixel for a given placement'''
+    hx, hy = halo
+    if where=='root': return 1.0
+    if where=='y': return (tile+2.0*hy)/tile
+    if where=='x': return (tile+2.0*hx)*(tile+2.0*hy)/tile**2
+    if where=='yi': return (tile+2.0*hx)/tile*(2*hy+1)
+    # inline: recomputed for every tap of every consumer
+    return sum(e*(2*rx+1)*(2*ry+1) for e, (rx, ry) in consumerEvals)
+
+def footprintBytes(where, halo, tile, width, height, bytesPerPixel=4):
+    '''size of the buffer allocated for a stage each time it is computed'''
+    hx, hy = halo
+    if where=='root': return width*height*bytesPerPixel
+    if where=='y': return (width+2*hx)*(tile+2*hy)*bytesPerPixel
+    if where=='x': return (tile+2*hx)*(tile+2*hy)*bytesPerPixel
+    if where=='yi': return (tile+2*hx)*(2*hy+1)*bytesPerPixel
+    return 0
+
+def search(width, height, tiles=[64, 128, 256], sigma=0.5, topK=8,
+           cacheBytes=256*1024, memWeight=2.0, fusedTensor=True):
+    '''enumerate every legal placement of the Harris stages and return the topK
+    (cost, tile, placement) triplets with the lowest estimated cost per output pixel.
+    Branches are pruned as soon as their partial cost exceeds the current topK-th best'''
+    graph=harris.harrisStageGraph(sigma, fusedTensor=fusedTensor)
+    # consumers are visited before their producers
+    order=list(reversed(graph))
+    best=[] # heap of (-cost, counter, tile, placement)
+    counter=[0]
+
+    def visit(i, tile, cost, placement, evals, depth, halo):
+        if len(best)==topK and cost>=-best[0][0]: return
+        if i==len(order):
+            counter[0]+=1
+            entry=(-cost, counter[0], tile, dict(placement))
+            if len(best)<topK: heapq.heappush(best, entry)
+            else: heapq.heapreplace(best, entry)
+            return
+        name, consumers, ops, channels, placements = order[i]
+        h=(max(halo[c][0]+rx for c, (rx, ry) in consumers.iteritems()),
+           max(halo[c][1]+ry for c, (rx, ry) in consumers.iteritems()))
+        consumerEvals=[(evals[c], consumers[c]) for c in consumers]
+        consumerDepth=min(depth[c] for c in consumers)
+        for where in placements or PLACEMENTS:
+            if where!='inline' and DEPTH[where]>consumerDepth: continue # illegal
+            e=evaluationsPerPixel(where, consumerEvals, h, tile)
+            c=e*ops
+            if where!='inline':
+                f=footprintBytes(where, h, tile, width, height, 4*channels)
+                missRate= 1.0 if f>cacheBytes else 0.1
+                c+=memWeight*missRate*e*4*channels*2 # write then read back
+            placement[name]=where
+            evals[name]=e
+            halo[name]=h
+            depth[name]=consumerDepth if where=='inline' else DEPTH[where]
+            visit(i+1, tile, cost+c, placement, evals, depth, halo)
+        del placement[name]
+
+    for tile in tiles:
+        visit(0, tile, 0.0, {}, {'Harris':1.0}, {'Harris':OUTPUT_DEPTH}, {'Harris':(0, 0)})
+
+    return [(-c, tile, p) for c, n, tile, p in sorted(best, reverse=True)]
+
+def benchmark(im, candidates, nTimes=3, profile=None):
+    '''run computeHarris for each (cost, tile, placement) candidate and return
+    (time, tile, placement) sorted from fastest to slowest.
+    With profile ('table' or 'json'), the winner is run once more with the profiler'''
+    results=[]
+    for cost, tile, placement in candidates:
+        print '\nestimated cost %.1f' % cost
+        L=[]
+        for i in xrange(nTimes):
+            output, dt=harris.computeHarris(im, None, tile, placement)
+            L.append(dt)
+        results.append((numpy.min(L), tile, placement))
+    results.sort()
+    if profile is not None and results:
+        dt, tile, placement=results[0]
+        harris.computeHarris(im, None, tile, placement, profile=profile)
+    return results
+
+def pythonCode(tile, placement, sigma=0.5, fusedTensor=True):
+    '''return the Python source of a schedule function equivalent to the given placement'''
+    L=['def harrisSchedule(harris, stages, tile=%d):' % tile,
+       "    x, y, xi, yi = Var('x'), Var('y'), Var('xi'), Var('yi')",
+       '    harris.tile(x, y, xi, yi, tile, tile)']
+    for name, consumers, ops, channels, placements in harris.harrisStageGraph(sigma, fusedTensor=fusedTensor):
+        where=placement[name]
+        if where=='inline':
+            L.append("    # %s is computed inline" % name)
+            continue
+        elif where=='root':
+            L.append("    stages['%s'].compute_root()" % name)
+        else:
+            L.append("    stages['%s'].compute_at(harris, %s)" % (name, where))
+        if name in harris.tensorStages:
+            L.append("    interleaveChannels(stages['%s'])" % name)
+    return '\n'.join(L)+'\n'
+
+def main():
+    im=synthetic.benchmarkImage()
+    candidates=search(im.shape[1], im.shape[0])
+    print 'best estimated placements:'
+    for cost, tile, placement in candidates:
+        print '%10.1f' % cost, tile, placement
+
+    profile='json' if 'json' in sys.argv else 'table' if 'profile' in sys.argv else None
+    results=benchmark(im, candidates, profile=profile)
+    dt, tile, placement=results[0]
+    print '\nwinner took ', dt, 'seconds\n'
+    code=pythonCode(tile, placement)
+    print code
+    paths=[a for a in sys.argv[1:] if a not in ['profile', 'json']]
+    if paths:
+        f=open(paths[0], 'w')
+        f.write(code)
+        f.close()
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+# Loop-nest simulator for the schedules of stencil pipelines.
+
+# The exercises of tutorial6 (and a11.pythonCodeForBoxSchedule5/6/7) ask for the order
+# in which a schedule evaluates blur_x and blur_y, written by hand as nested loops.
+# Here the loop nest is generated from a description of the pipeline and of the
+# schedule, as Halide would: the output is split and reordered, each producer is
+# computed inline, at root or at one of the loops of the output, over the region
+# that its consumers need (bounds inference), in y, x order.
+# The evaluation trace is a set of numpy arrays, one entry per event:
+#     stage  index in pipeline.names ('input' is 0)
+#     x, y   coordinates of the value
+#     op     STORE (the value is computed and stored), LOAD (a stored value is read)
+#            or INLINE (the value is recomputed inside its consumer, nothing is stored)
+#     address  byte address of the value in the buffer that holds it, -1 for INLINE
+# From the trace we get the recompute factor of each stage, the size of its buffers
+# and the reuse distance of its loads, without compiling anything. The Python loops
+# go down to the innermost compute_at level, so keep the images small.
+
+import os, sys
+import numpy
+
+STORE, LOAD, INLINE = 0, 1, 2
+
+class Pipeline:
+    '''stages is a list of (name, reads) in producer to consumer order, the last one
+    being the output. reads maps the name of a producer ('input' or an earlier stage)
+    to the list of (dx, dy) offsets at which the stage reads it'''
+    def __init__(self, stages):
+        self.stages=stages
+        self.names=['input']+[name for name, reads in stages]
+        self.reads=dict(stages)
+        self.output=stages[-1][0]
+
+    def consumers(self, name):
+        return [c for c, reads in self.stages if name in reads]
+
+class Schedule:
+    '''split maps 'x' and/or 'y' to a split factor, like blur_y.split(x, xo, xi, factor).
+    order lists the loops of the output from outermost to innermost, by default the
+    splits are done in place (y outer of x). placement maps producers to 'inline'
+    (the default), 'root' or the name of a loop of the output (compute_at)'''
+    def __init__(self, split={}, order=None, placement={}):
+        self.split=dict(split)
+        if order is None:
+            order=[]
+            for v in ['y', 'x']:
+                order+=[v+'o', v+'i'] if v in self.split else [v]
+        self.order=list(order)
+        self.placement=dict(placement)
+
+def tile(tileX, tileY, placement={}):
+    '''Schedule of output.tile(x, y, xo, yo, xi, yi, tileX, tileY)'''
+    return Schedule({'x':tileX, 'y':tileY}, ['yo', 'xo', 'yi', 'xi'], placement)
+
+class Trace:
+    def __init__(self, names, stage, x, y, op, address, allocations):
+        self.names=names
+        self.stage, self.x, self.y, self.op, self.address = stage, x, y, op, address
+        # allocations[name] is the list of buffer sizes in bytes, one per allocation
+        self.allocations=allocations
+
+    def __len__(self):
+        return len(self.stage)
+
+    def evaluationOrder(self):
+        '''computations of the stages as [(name, x, y), ...], the format of the
+        pythonCodeForBoxSchedule exercises'''
+        keep=numpy.nonzero((self.op!=LOAD)&(self.stage>0))[0]
+        return [(self.names[self.stage[i]], int(self.x[i]), int(self.y[i])) for i in keep]
+
+def halos(pipeline):
+    '''(dx0, dx1, dy0, dy1) for each stage: the box of values of the stage needed
+    by one pixel of the output'''
+    halo={pipeline.output:(0, 0, 0, 0)}
+    for name in reversed(pipeline.names[:-1]):
+        boxes=[]
+        for c in pipeline.consumers(name):
+            ox=[dx for dx, dy in pipeline.reads[c][name]]
+            oy=[dy for dx, dy in pipeline.reads[c][name]]
+            h=halo[c]
+            boxes.append((h[0]+min(ox), h[1]+max(ox), h[2]+min(oy), h[3]+max(oy)))
+        halo[name]=(min(b[0] for b in boxes), max(b[1] for b in boxes),
+                    min(b[2] for b in boxes), max(b[3] for b in boxes))
+    return halo
+
+def expandReads(pipeline, name, placement):
+    '''(loads, inlines) of one evaluation of the stage name: the stored values it reads
+    and the inline values it recomputes, as lists of (stage, dx, dy)'''
+    loads, inlines = [], []
+    for producer, offsets in pipeline.reads[name].iteritems():
+        for dx, dy in offsets:
+            if producer!='input' and placement.get(producer, 'inline')=='inline':
+                inlines.append((producer, dx, dy))
+                l, i = expandReads(pipeline, producer, placement)
+                loads+=[(p, dx+ex, dy+ey) for p, ex, ey in l]
+                inlines+=[(p, dx+ex, dy+ey) for p, ex, ey in i]
+            else:
+                loads.append((producer, dx, dy))
+    return loads, inlines
+
+def simulate(pipeline, schedule, width, height):
+    '''evaluation Trace of the pipeline output realized over width x height'''
+    names=pipeline.names
+    index=dict((n, i) for i, n in enumerate(names))
+    halo=halos(pipeline)
+    placement=schedule.placement
+    order=schedule.order
+    factor=dict((v, min(f, width if v=='x' else height)) for v, f in schedule.split.iteritems())
+    size={'x':width, 'y':height}
+    extent={}
+    for v in ['x', 'y']:
+        if v in factor:
+            extent[v+'o']=(size[v]+factor[v]-1)/factor[v]
+            extent[v+'i']=factor[v]
+        else:
+            extent[v]=size[v]
+
+    # producers computed at each level: 0 is root, k is inside the loop order[k-1]
+    atLevel=[[] for i in xrange(len(order)+1)]
+    levelOf={}
+    for name in names[1:-1]:
+        where=placement.get(name, 'inline')
+        if where=='inline': continue
+        levelOf[name]=0 if where=='root' else order.index(where)+1
+        atLevel[levelOf[name]].append(name)
+    # a producer cannot be computed inside the loops of a consumer computed outside them
+    for name, level in levelOf.iteritems():
+        for c in pipeline.consumers(name):
+            if c in levelOf and levelOf[c]<level:
+                raise ValueError('%s is computed inside the loops of its consumer %s' % (name, c))
+    deepest=max(levelOf.values()+[0])
+
+    expanded=dict((n, expandReads(pipeline, n, placement)) for n in names[1:])
+    # every stage has its own address range, staggered so that the buffers do not
+    # all start on the same cache set
+    base=dict((n, (i<<32)+i*4160) for i, n in enumerate(names))
+    # current buffer (x0, y0, width) of each stored stage
+    buffers={'input':(halo['input'][0], halo['input'][2], width+halo['input'][1]-halo['input'][0]),
+             pipeline.output:(0, 0, width)}
+    allocations=dict((n, []) for n in names)
+    allocations['input'].append(4*buffers['input'][2]*(height+halo['input'][3]-halo['input'][2]))
+    allocations[pipeline.output].append(4*width*height)
+    chunks=[]
+
+    def coordinates(v, fixed):
+        # the coordinates along v covered by the fixed loops, splits shifted inward
+        if v in factor:
+            outer=numpy.arange(extent[v+'o']) if v+'o' not in fixed else numpy.array([fixed[v+'o']])
+            inner=numpy.arange(factor[v]) if v+'i' not in fixed else numpy.array([fixed[v+'i']])
+            return (numpy.minimum(outer*factor[v], size[v]-factor[v])[:, None]+inner[None, :]).ravel()
+        if v in fixed: return numpy.array([fixed[v]])
+        return numpy.arange(size[v])
+
+    def address(name, xs, ys):
+        x0, y0, w = buffers[name]
+        return base[name]+4*((ys-y0)*w+(xs-x0))
+
+    def evaluate(name, xs, ys):
+        # events of the evaluation of name at the points xs, ys, point after point
+        loads, inlines = expanded[name]
+        cols=[]
+        for p, dx, dy in inlines:
+            cols.append((index[p], xs+dx, ys+dy, INLINE, -numpy.ones(len(xs), numpy.int64)))
+        for p, dx, dy in loads:
+            cols.append((index[p], xs+dx, ys+dy, LOAD, address(p, xs+dx, ys+dy)))
+        cols.append((index[name], xs, ys, STORE, address(name, xs, ys)))
+        n, k = len(xs), len(cols)
+        stage=numpy.empty((n, k), numpy.int16)
+        x=numpy.empty((n, k), numpy.int32)
+        y=numpy.empty((n, k), numpy.int32)
+        op=numpy.empty((n, k), numpy.int8)
+        addr=numpy.empty((n, k), numpy.int64)
+        for j, (s, cx, cy, o, a) in enumerate(cols):
+            stage[:, j], x[:, j], y[:, j], op[:, j], addr[:, j] = s, cx, cy, o, a
+        chunks.append((stage.ravel(), x.ravel(), y.ravel(), op.ravel(), addr.ravel()))
+
+    def produce(name, fixed):
+        xs, ys = coordinates('x', fixed), coordinates('y', fixed)
+        h=halo[name]
+        x0, x1 = xs.min()+h[0], xs.max()+h[1]
+        y0, y1 = ys.min()+h[2], ys.max()+h[3]
+        buffers[name]=(x0, y0, x1-x0+1)
+        allocations[name].append(4*(x1-x0+1)*(y1-y0+1))
+        py, px = numpy.mgrid[y0:y1+1, x0:x1+1]
+        evaluate(name, px.ravel(), py.ravel())
+
+    def visit(level, fixed):
+        for name in atLevel[level]:
+            produce(name, fixed)
+        if level==deepest:
+            # the remaining loops of the output, vectorized
+            rest=order[level:]
+            grids=numpy.meshgrid(*[numpy.arange(extent[v]) for v in rest], indexing='ij')
+            values=dict(fixed)
+            for v, g in zip(rest, grids): values[v]=g.ravel()
+            n=grids[0].size if rest else 1
+            xy=[]
+            for v in ['x', 'y']:
+                if v in factor:
+                    c=numpy.minimum(values[v+'o']*factor[v], size[v]-factor[v])+values[v+'i']
+                else:
+                    c=values[v]
+                xy.append(numpy.zeros(n, numpy.int64)+c)
+            evaluate(pipeline.output, xy[0], xy[1])
+            return
+        v=order[level]
+        for i in xrange(extent[v]):
+            fixed[v]=i
+            visit(level+1, fixed)
+        del fixed[v]
+
+    visit(0, {})
+    fields=[numpy.concatenate([c[j] for c in chunks]) for j in xrange(5)]
+    return Trace(names, *(fields+[allocations]))
+
+def recomputeFactors(trace):
+    '''evaluations of each stage divided by the number of distinct values evaluated'''
+    result={}
+    computed=trace.op!=LOAD
+    for i, name in enumerate(trace.names[1:], 1):
+        sel=computed&(trace.stage==i)
+        n=numpy.count_nonzero(sel)
+        if n==0: continue
+        keys=trace.x[sel].astype(numpy.int64)*(1<<32)+trace.y[sel]
+        result[name]=float(n)/len(numpy.unique(keys))
+    return result
+
+def reuseDistances(trace):
+    '''for every LOAD, the number of memory accesses (LOAD or STORE) since the previous
+    access to the same address, -1 for the first access. Returns (stage, distance) arrays'''
+    memory=numpy.nonzero(trace.op!=INLINE)[0]
+    addr=trace.address[memory]
+    order=numpy.argsort(addr, kind='mergesort')
+    previous=-numpy.ones(len(addr), numpy.int64)
+    same=addr[order[1:]]==addr[order[:-1]]
+    previous[order[1:][same]]=order[:-1][same]
+    distance=numpy.where(previous>=0, numpy.arange(len(addr))-previous, -1)
+    loads=trace.op[memory]==LOAD
+    return trace.stage[memory][loads], distance[loads]
+
+def report(trace):
+    '''per stage: evaluations, recompute factor, loads from it, largest buffer and number
+    of allocations in bytes, median and 90th percentile of the reuse distance of its loads'''
+    recompute=recomputeFactors(trace)
+    stages, distances = reuseDistances(trace)
+    rows=[]
+    for i, name in enumerate(trace.names):
+        d=distances[(stages==i)&(distances>=0)]
+        computed=numpy.count_nonzero((trace.op!=LOAD)&(trace.stage==i))
+        sizes=trace.allocations[name]
+        rows.append({'name': name, 'evaluations': computed, 'recompute': recompute.get(name, 0.0),
+                     'loads': numpy.count_nonzero(stages==i),
+                     'bufferBytes': max(sizes) if sizes else 0, 'allocations': len(sizes),
+                     'reuseMedian': numpy.median(d) if len(d) else 0,
+                     'reuse90': numpy.percentile(d, 90) if len(d) else 0})
+    return rows
+
+def formatReport(rows):
+    L=['%-10s %10s %9s %10s %12s %6s %10s %10s' % ('stage', 'evals', 'recompute', 'loads',
+       'buffer', 'allocs', 'reuse med', 'reuse 90%')]
+    for r in rows:
+        L.append('%-10s %10d %9.3f %10d %12d %6d %10d %10d' % (r['name'], r['evaluations'],
+                 r['recompute'], r['loads'], r['bufferBytes'], r['allocations'],
+                 r['reuseMedian'], r['reuse90']))
+    return '\n'.join(L)
+
+# the 3x3 box blur of tutorial6, not centered
+box3x3=Pipeline([('blur_x', {'input':[(0, 0), (1, 0), (2, 0)]}),
+                 ('blur_y', {'blur_x':[(0, 0), (0, 1), (0, 2)]})])
+
+# schedules 1 to 4 of tutorial6 and 5 to 7 of its exercises.
+# Schedule 4 only adds parallelism and vectors to 3, which do not change the trace
+tutorial6Schedules={1: Schedule(placement={'blur_x':'root'}),
+                    2: Schedule(),
+                    3: tile(256, 32, {'blur_x':'xo'}),
+                    4: tile(256, 32, {'blur_x':'xo'}),
+                    5: Schedule(placement={'blur_x':'x'}),
+                    6: tile(2, 2, {'blur_x':'yo'}),
+                    7: Schedule({'x':2}, placement={'blur_x':'y'})}
+
+def main():
+    width, height = 256, 256
+    for i in sorted(tutorial6Schedules):
+        trace=simulate(box3x3, tutorial6Schedules[i], width, height)
+        print '\nschedule ', i, ',', len(trace), 'events'
+        print formatReport(report(trace))
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+# Processing of a sequence of PNG frames, with decode, realize and encode overlapped.
+
+# Each frame goes through three stages, each in its own thread, connected by bounded
+# queues: while frame i is realized, frame i+1 is decoded and frame i-1 is encoded.
+# The queues hold at most depth frames, so a slow stage blocks the ones before it
+# instead of filling the memory with decoded frames.
+# The pipeline is compiled once for the whole sequence: its input is an ImageParam
+# that is set to every frame before its realize.
+# The speed of the slowest stage sets the frame rate. The PNG codec (png.py) is pure
+# Python and holds the GIL, so decode and encode only overlap with the parts of a
+# realize that run without it; the busy time of each stage is reported to see which
+# one limits the rate.
+#
+#   python sequence.py Input/frames                      box blur, written to Output/box
+#   python sequence.py Input/frames harris Output/corners
+#   python sequence.py synthetic sobel                   on 64 generated frames
+
+import os, sys
+from halide import *
+import time
+import threading
+import Queue
+import collections
+import numpy
+
+import png
+import synthetic
+import harris
+import tutorial10_convolutionSchedule
+
+def framePaths(directory):
+    '''the PNG files of directory, in the order of their names'''
+    names=sorted(n for n in os.listdir(directory) if n.lower().endswith('.png'))
+    return [os.path.join(directory, n) for n in names]
+
+def decode(path, gamma=2.2):
+    '''float32 RGB numpy image [y, x, c] of a PNG file, linearized like imageIO.imread.
+    Greyscale frames are repeated in the three channels, alpha is dropped'''
+    width, height, rows, info = png.Reader(filename=path).asFloat()
+    planes=info['planes']
+    a=numpy.array([numpy.asarray(r, numpy.float32) for r in rows]).reshape(height, width, planes)
+    if info['alpha']: a=a[:, :, :planes-1]
+    if a.shape[2]==1: a=numpy.repeat(a, 3, axis=2)
+    return numpy.ascontiguousarray(a**gamma, numpy.float32)
+
+def encode(im, path, gamma=2.2):
+    '''write a numpy image [y, x, c] or [y, x] with values in [0, 1] to a PNG file,
+    gamma encoded like imageIO.imwrite'''
+    greyscale=im.ndim==2
+    height, width = im.shape[0], im.shape[1]
+    values=numpy.clip(im, 0, 1)**(1.0/gamma)
+    rows=(255*values+0.5).astype(numpy.uint8).reshape(height, -1)
+    f=open(path, 'wb')
+    png.Writer(width, height, greyscale=greyscale).write(f, rows)
+    f.close()
+
+def boxPipeline(frame, tile=128):
+    '''(output Func, channels, gamma) of the box blur of tutorial10, schedule 5'''
+    return tutorial10_convolutionSchedule.boxBlurFunc(frame, 5, tile, tile), 3, 2.2
+
+def sobelPipeline(frame, tile=128):
+    '''magnitude of the Sobel gradient of the luminance, like a11.sobel'''
+    x, y, xo, yo, xi, yi = Var('x'), Var('y'), Var('xo'), Var('yo'), Var('xi'), Var('yi')
+    lumi=harris.luminance(frame)
+    gx, gy = harris.SobelX(lumi, frame), harris.SobelY(lumi, frame)
+    magnitude=Func('sobelMagnitude')
+    magnitude[x,y]=sqrt(gx[x,y]**2+gy[x,y]**2)
+    magnitude.tile(x, y, xo, yo, xi, yi, tile, tile).parallel(yo).vectorize(xi, 8)
+    lumi.compute_at(magnitude, xo).vectorize(x, 8)
+    return magnitude, None, 1.0
+
+def harrisPipeline(frame, tile=128):
+    '''the corner mask of harris.computeHarris, schedule 1, with the tiles in parallel'''
+    output, stages = harris.harrisStages(frame)
+    placement=dict((name, 'x') for name in stages if name not in ['lumi', 'blurredLumiXX'])
+    harris.applyPlacement(output, stages, placement, tile)
+    output.parallel(Var('y'))
+    return output, None, 1.0
+
+pipelines={'box':boxPipeline, 'sobel':sobelPipeline, 'harris':harrisPipeline}
+
+class Stage(threading.Thread):
+    '''thread that calls work on every item of inbox and puts the result in outbox,
+    until it gets None, which it passes on. After an error it only drains inbox,
+    so that the stages before it never block on a full queue'''
+    def __init__(self, name, work, inbox, outbox=None):
+        threading.Thread.__init__(self, name=name)
+        self.daemon=True
+        self.work, self.inbox, self.outbox = work, inbox, outbox
+        self.busy=0.0
+        self.error=None
+    def run(self):
+        while True:
+            item=self.inbox.get()
+            if item is None: break
+            if self.error is not None: continue
+            t=time.time()
+            try:
+                result=self.work(item)
+            except Exception as e:
+                self.error=e
+                continue
+            self.busy+=time.time()-t
+            if self.outbox is not None: self.outbox.put(result)
+        if self.outbox is not None: self.outbox.put(None)
+
+class FrameRate:
+    '''frames per second over the last window frames, and since the start'''
+    def __init__(self, window=16):
+        self.start=time.time()
+        self.times=collections.deque(maxlen=window+1)
+        self.times.append(self.start)
+        self.count=0
+    def tick(self):
+        self.count+=1
+        self.times.append(time.time())
+    def current(self):
+        if len(self.times)<2: return 0.0
+        return (len(self.times)-1)/(self.times[-1]-self.times[0])
+    def overall(self):
+        return self.count/(time.time()-self.start)
+
+def runSequence(directory, pipeline='box', outputDirectory=None, depth=2, tile=128, live=True):
+    '''run pipelines[pipeline] on every frame of directory and write the results with
+    the same names in outputDirectory (Output/<pipeline> by default).
+    Returns the number of frames, the overall frames per second and the busy time of
+    each stage'''
+    if outputDirectory is None: outputDirectory=os.path.join('Output', pipeline)
+    if not os.path.exists(outputDirectory): os.makedirs(outputDirectory)
+    paths=framePaths(directory)
+
+    frame=ImageParam(Float(32), 3, 'frame')
+    output, channels, gamma = pipelines[pipeline](frame, tile)
+    output.compile_jit()
+    rate=FrameRate()
+
+    def decodeFrame(path):
+        return path, decode(path)
+
+    def realizeFrame(item):
+        path, im = item
+        frame.set(Image(Float(32), im))
+        sizes=(im.shape[1], im.shape[0]) if channels is None else (im.shape[1], im.shape[0], channels)
+        return path, numpy.array(Image(output.realize(*sizes)))
+
+    def encodeFrame(item):
+        path, im = item
+        encode(im, os.path.join(outputDirectory, os.path.basename(path)), gamma)
+        rate.tick()
+        if live:
+            sys.stdout.write('\r%5d/%d frames, %6.2f fps' % (rate.count, len(paths), rate.current()))
+            sys.stdout.flush()
+
+    # the paths are all known, only the frames are bounded
+    pending, decoded, realized = Queue.Queue(), Queue.Queue(depth), Queue.Queue(depth)
+    stages=[Stage('decode', decodeFrame, pending, decoded),
+            Stage('realize', realizeFrame, decoded, realized),
+            Stage('encode', encodeFrame, realized)]
+    for path in paths: pending.put(path)
+    pending.put(None)
+    for s in stages: s.start()
+    for s in stages: s.join()
+    if live: print
+
+    for s in stages:
+        if s.error is not None:
+            print s.name, 'failed: ', s.error
+    fps=rate.overall()
+    print rate.count, 'frames, ', fps, 'frames per second'
+    busy=dict((s.name, s.busy) for s in stages)
+    perFrame=rate.count if rate.count>0 else 1
+    for s in stages:
+        print '%-8s busy %8.3f seconds, %6.2f ms per frame' % (s.name, s.busy, 1e3*s.busy/perFrame)
+    return rate.count, fps, busy
+
+def writeSyntheticSequence(directory, count=64, width=640, height=480):
+    '''count frames panning across a synthetic image, to have something to run on'''
+    if not os.path.exists(directory): os.makedirs(directory)
+    source=numpy.array(synthetic.image('pink', width+2*count, height))
+    for i in xrange(count):
+        encode(source[:, 2*i:2*i+width], os.path.join(directory, 'frame%04d.png' % i))
+    return directory
+
+def main():
+    directory=sys.argv[1] if len(sys.argv)>1 else 'synthetic'
+    pipeline=sys.argv[2] if len(sys.argv)>2 else 'box'
+    outputDirectory=sys.argv[3] if len(sys.argv)>3 else None
+    if directory=='synthetic':
+        directory=writeSyntheticSequence(os.path.join('Input', 'synthetic', 'sequence'))
+    runSequence(directory, pipeline, outputDirectory)
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# Deterministic synthetic images for the benchmarks.
+
+# The benchmarks all read Input/hk.npy, a single photograph at a single size. This module
+# generates reproducible images of any size from 256x256 to 16k x 16k:
+#     noise         uniform white noise
+#     gradient      linear ramps, horizontal, vertical and diagonal in the three channels
+#     checkerboard  black and white squares
+#     pink          noise with a 1/f amplitude spectrum like natural images, built as a
+#                   sum of octaves of bilinearly interpolated random grids of equal amplitude
+# in float32 (in [0, 1]), uint8 or uint16, with 1 or 3 channels.
+# Images are generated a strip of rows at a time straight into a .npy file, and returned
+# memory-mapped, so that the largest ones never have to fit in memory. The random numbers
+# of every row are seeded from the row index, so the pixels do not depend on the strip size.
+
+import os, sys
+import numpy
+
+sizes=[256, 512, 1024, 2048, 4096, 8192, 16384]
+kinds=['noise', 'gradient', 'checkerboard', 'pink']
+
+defaultCache=os.path.join('Input', 'synthetic')
+
+def rowSeed(seed, *keys):
+    '''32-bit seed for a row of random numbers'''
+    h=seed
+    for k in keys: h=(h*1000003+k+1)%(2**32)
+    return h
+
+def noiseRows(y0, y1, width, channels, seed):
+    return numpy.array([numpy.random.RandomState(rowSeed(seed, 0, y)).rand(width, channels)
+                        for y in xrange(y0, y1)], numpy.float32)
+
+def gradientRows(y0, y1, width, height, channels):
+    y, x = numpy.mgrid[y0:y1, 0:width].astype(numpy.float32)
+    u, v = x/max(width-1, 1), y/max(height-1, 1)
+    ramps=[u, v, (u+v)/2]
+    return numpy.dstack([ramps[c%3] for c in xrange(channels)])
+
+def checkerboardRows(y0, y1, width, channels, square):
+    y, x = numpy.mgrid[y0:y1, 0:width]
+    board=((x/square+y/square)%2).astype(numpy.float32)
+    return numpy.dstack([board]*channels)
+
+def octaves(width, height):
+    '''grid spacings of the octaves of the pink noise, 1 to about half the image'''
+    s, L = 1, []
+    while s<=max(width, height)/2:
+        L.append(s)
+        s*=2
+    return L
+
+def pinkRows(y0, y1, width, height, channels, seed):
+    spacings=octaves(width, height)
+    out=numpy.zeros((y1-y0, width, channels), numpy.float32)
+    ys=numpy.arange(y0, y1)
+    for o, s in enumerate(spacings):
+        gridWidth=width/s+2
+        xs=numpy.arange(width)/float(s)
+        ix=xs.astype(int)
+        fx=(xs-ix).astype(numpy.float32)
+        iy=ys/s
+        fy=(ys/float(s)-iy).astype(numpy.float32)[:, None]
+        for c in xrange(channels):
+            rows={}
+            for j in numpy.unique(numpy.concatenate([iy, iy+1])):
+                g=numpy.random.RandomState(rowSeed(seed, 1+o, c, j)).rand(gridWidth)*2-1
+                rows[j]=(g[ix]*(1-fx)+g[ix+1]*fx).astype(numpy.float32)
+            top=numpy.array([rows[j] for j in iy])
+            bottom=numpy.array([rows[j] for j in iy+1])
+            out[:, :, c]+=top*(1-fy)+bottom*fy
+    # each octave has a standard deviation of about 0.5: keep 3 sigma of the sum in [0, 1]
+    return numpy.clip(0.5+out/(3*numpy.sqrt(len(spacings))), 0, 1)
+
+def rows(kind, y0, y1, width, height, channels=3, seed=0, square=32):
+    '''rows y0 to y1 of a float32 image in [0, 1], shape (y1-y0, width, channels)'''
+    if kind=='noise': return noiseRows(y0, y1, width, channels, seed)
+    if kind=='gradient': return gradientRows(y0, y1, width, height, channels)
+    if kind=='checkerboard': return checkerboardRows(y0, y1, width, channels, square)
+    if kind=='pink': return pinkRows(y0, y1, width, height, channels, seed)
+    raise ValueError('unknown kind of image %s, expected one of %s' % (kind, kinds))
+
+def convert(im, dtype):
+    '''float image in [0, 1] to dtype, integers covering their whole range'''
+    dtype=numpy.dtype(dtype)
+    if dtype.kind=='f': return im.astype(dtype)
+    return numpy.floor(im*numpy.iinfo(dtype).max+0.5).astype(dtype)
+
+def path(kind, width, height, dtype, channels, seed, cacheDir=None):
+    name='%s_%dx%d_%dc_%s_seed%d.npy' % (kind, width, height, channels, numpy.dtype(dtype).name, seed)
+    return os.path.join(cacheDir or defaultCache, name)
+
+def image(kind='pink', width=1024, height=None, dtype='float32', channels=3, seed=0,
+          cacheDir=None, stripHeight=256):
+    '''memory-mapped numpy image [y, x, c] ([y, x] for a single channel), generated
+    the first time and read from the cache after that'''
+    if height is None: height=width
+    p=path(kind, width, height, dtype, channels, seed, cacheDir)
+    if not os.path.exists(p):
+        if not os.path.exists(os.path.dirname(p)): os.makedirs(os.path.dirname(p))
+        shape=(height, width) if channels==1 else (height, width, channels)
+        tmp=p+'.tmp'
+        out=numpy.lib.format.open_memmap(tmp, 'w+', numpy.dtype(dtype), shape)
+        for y0 in xrange(0, height, stripHeight):
+            y1=min(y0+stripHeight, height)
+            strip=convert(rows(kind, y0, y1, width, height, channels, seed), dtype)
+            out[y0:y1]=strip[:, :, 0] if channels==1 else strip
+        out.flush()
+        del out
+        # readers never see a partial file
+        os.rename(tmp, p)
+    return numpy.load(p, mmap_mode='r')
+
+def benchmarkImage(size=None, kind='pink'):
+    '''input of the benchmarks: Input/hk.npy if it exists and no size is asked for,
+    otherwise (or if BENCHMARK_SIZE is set) a synthetic float32 RGB image of that width,
+    4:3, loaded in memory'''
+    if size is None and 'BENCHMARK_SIZE' in os.environ:
+        size=int(os.environ['BENCHMARK_SIZE'])
+    if size is None:
+        if os.path.exists(os.path.join('Input', 'hk.npy')):
+            return numpy.load(os.path.join('Input', 'hk.npy'))
+        size=1536
+    return numpy.array(image(kind, size, size*3/4))
+
+def main():
+    # the whole set up to 4k, in every type
+    for kind in kinds:
+        for size in sizes[:5]:
+            for dtype in ['float32', 'uint8', 'uint16']:
+                for channels in [1, 3]:
+                    im=image(kind, size, size, dtype, channels)
+                    print path(kind, size, size, dtype, channels, 0), im.shape, im.dtype
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
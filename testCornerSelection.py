@@ -0,0 +1,63 @@
+# cornerSelection.anms must select the same corners as a brute-force ANMS.
+
+# The brute force computes the suppression radius of every corner against every other
+# corner, in O(N^2), with the same tie breaking as anms: largest radius first, then the
+# strongest response, corners of equal response in their input order.
+# The corner sets are random integer positions, as harris.harrisCorners returns them,
+# with responses drawn from few values so that ties happen.
+#
+#   python testCornerSelection.py           200 random cases
+#   python testCornerSelection.py 1000      1000 random cases
+#
+# The exit status is 1 if any case differs.
+
+import os, sys
+import numpy
+
+import cornerSelection
+
+def bruteForceAnms(corners, k, cRobust=0.9):
+    n=len(corners)
+    order=numpy.argsort(-corners[:, 2], kind='mergesort')
+    xs=corners[order, 0].astype(numpy.float64)
+    ys=corners[order, 1].astype(numpy.float64)
+    # anms compares float32 responses scaled by a python float, in double precision
+    r=corners[order, 2].astype(numpy.float64)
+    radius=numpy.empty(n)
+    for i in xrange(n):
+        stronger=r[i]<cRobust*r
+        if not stronger.any():
+            radius[i]=numpy.inf
+        else:
+            radius[i]=numpy.sqrt(numpy.min((xs[stronger]-xs[i])**2+(ys[stronger]-ys[i])**2))
+    best=numpy.lexsort((numpy.arange(n), -radius))[:k]
+    return corners[order[best]]
+
+def randomCorners(rng):
+    n=rng.randint(2, 400)
+    width, height = rng.randint(8, 1024, 2)
+    corners=numpy.empty((n, 3), numpy.float32)
+    corners[:, 0]=rng.randint(0, width, n)
+    corners[:, 1]=rng.randint(0, height, n)
+    corners[:, 2]=rng.randint(1, 50, n)/numpy.float32(7)
+    return corners
+
+def main():
+    count=int(sys.argv[1]) if len(sys.argv)>1 else 200
+    rng=numpy.random.RandomState(0)
+    failures=0
+    for case in xrange(count):
+        corners=randomCorners(rng)
+        k=rng.randint(1, len(corners)+1)
+        cellSize=None if case%2==0 else float(rng.randint(1, 64))
+        fast=cornerSelection.anms(corners, k, cellSize=cellSize)
+        slow=bruteForceAnms(corners, k)
+        if not numpy.array_equal(fast, slow):
+            failures+=1
+            print 'case', case, ':', len(corners), 'corners, k=', k, 'cellSize', cellSize, 'differs'
+    print count-failures, 'of', count, 'cases agree with the brute force'
+    if failures: sys.exit(1)
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
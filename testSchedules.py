@@ -0,0 +1,263 @@
+# Every schedule of a pipeline must compute the same pixels, and should not get slower.
+
+# Each schedule of tutorial10_convolutionSchedule.boxBlur (0-6), harris.computeHarris (0-2),
+# tutorial6_3x3box_schedule (1-4) and the running sum box blur of tutorial10 (odd widths)
+# is realized on a deterministic input and compared with the numpy version of reference.
+# The batched pipelines of batch run on crops of mixed sizes and are compared with the
+# crops realized one at a time, and the prefixes of Harris realized by
+# boundary.realizeSplit are compared with the same prefixes clamped everywhere.
+# The sparse corners of harris.harrisCorners are compared with the dense mask and the
+# response of reference on an image whose width is not a multiple of 8.
+# The parallel reductions of reductions are compared with reference.channelSum,
+# channelMean and histogram on the same image, whose size is a multiple of neither the
+# vector width nor the strip height.
+# integralImage.box_mean is compared with the cumulative sums of reference, and the
+# recursive Gaussian of harris with reference.gaussianIIR and, away from the borders,
+# with the direct convolution. The time per megapixel of every case is then compared
+# with the one stored for this host in baselines/<hostname>.json: a schedule fails if it
+# is slower than its baseline by more than the tolerance.
+#
+#   python testSchedules.py             check, with a tolerance of 25%
+#   python testSchedules.py 10          check, with a tolerance of 10%
+#   python testSchedules.py update      check the pixels and store the times as baseline
+#
+# Schedules without a baseline pass and get one. The exit status is 1 if anything failed.
+
+import os, sys
+import time
+import socket
+import json
+import numpy
+from halide import *
+
+import reference
+import synthetic
+import harris
+import batch
+import boundary
+import integralImage
+import reductions
+import tutorial6_3x3box_schedule
+import tutorial10_convolutionSchedule
+
+def deterministicImage(width=512, height=384, channels=3, seed=0):
+    '''float32 image in [0, 1] that is the same on every run, with a natural image spectrum'''
+    return numpy.array(synthetic.image('pink', width, height, 'float32', channels, seed))
+
+def boxBlurCase(im, i, tile=128):
+    output, dt = tutorial10_convolutionSchedule.boxBlur(im, i, tile, tile)
+    # boxBlur returns the time of its 5 runs
+    return numpy.array(Image(output)), dt/5
+
+def harrisCase(im, i, tile=128):
+    output, dt = harris.computeHarris(im, i, tile)
+    return numpy.array(Image(output)), dt
+
+def mixedCrops(im, sizes=[(40, 52), (64, 37), (33, 61), (57, 57), (48, 29)]):
+    '''crops of im of different (width, height), for the batched pipelines'''
+    return [numpy.ascontiguousarray(im[3*i:3*i+h, 5*i:5*i+w]) for i, (w, h) in enumerate(sizes)]
+
+def flattened(outputs):
+    return numpy.concatenate([numpy.ravel(o) for o in outputs])
+
+def runningCase(im, width):
+    output, dt = tutorial10_convolutionSchedule.runningBoxBlur(im, width)
+    return numpy.array(Image(output)), dt/5
+
+def batchCase(images, i):
+    outputs, dt = batch.batchedBoxBlur(images, i)
+    return flattened(outputs), dt
+
+def harrisBatchCase(images):
+    outputs, dt = batch.batchedHarris(images)
+    return flattened(outputs), dt
+
+def splitCase(im, name, tile=128):
+    input=Image(Float(32), im)
+    build, radius = harris.prefixBuilder(input, name, tile)
+    return boundary.realizeSplit(build, im.shape[1], im.shape[0], radius, input)
+
+def clampedPrefix(im, name, tile=128):
+    input=Image(Float(32), im)
+    build, radius = harris.prefixBuilder(input, name, tile)
+    return boundary.realizeClamped(build, im.shape[1], im.shape[0], input)[0]
+
+def boxMeanCase(im, radius):
+    input=Image(Float(32), im)
+    mean=integralImage.box_mean(input, radius, input.width(), input.height(), input.channels())
+    mean.compile_jit()
+    t=time.time()
+    output=mean.realize(input.width(), input.height(), input.channels())
+    dt=time.time()-t
+    return numpy.array(Image(output)), dt
+
+def cornerMaskCase(im):
+    '''the corners of harris.harrisCorners drawn as a dense mask'''
+    t=time.time()
+    corners=harris.harrisCorners(im)
+    dt=time.time()-t
+    mask=numpy.zeros(im.shape[:2], numpy.float32)
+    mask[corners[:, 1].astype(int), corners[:, 0].astype(int)]=1.0
+    return mask, dt
+
+def cornerResponseCase(im, R):
+    '''R with the responses of harris.harrisCorners written at the corners, so that only
+    the responses at the corners differ from R, whatever ties change in the detection'''
+    t=time.time()
+    corners=harris.harrisCorners(im)
+    dt=time.time()-t
+    response=R.copy()
+    response[corners[:, 1].astype(int), corners[:, 0].astype(int)]=corners[:, 2]
+    return response, dt
+
+def reductionCase(im, name, scale=1.0):
+    '''reductions.parallel_sum, parallel_mean or histogram (of the green channel) of im,
+    divided by scale'''
+    input=Image(Float(32), im)
+    w, h, nc = input.width(), input.height(), input.channels()
+    if name=='histogram':
+        x, y = Var('x'), Var('y')
+        green=Func('green')
+        green[x, y]=input[x, y, 1]
+        output, dt = reductions.realizeReduction(reductions.histogram(green, w, h), 256, 1)
+    else:
+        f=getattr(reductions, name)(input, w, h, nc)
+        output, dt = reductions.realizeReduction(f, nc, 1)
+    return output/scale, dt
+
+def gaussianCase(im, sigma, method, border=0, scale=1.0):
+    '''harris.GaussianSingleChannel of the luminance of im, without the border pixels
+    on each side and divided by scale'''
+    input=Image(Float(32), im)
+    blur, blurX = harris.GaussianSingleChannel(harris.luminance(input), input, sigma, 3, method)
+    blur.compile_jit()
+    t=time.time()
+    output=blur.realize(input.width(), input.height())
+    dt=time.time()-t
+    output=numpy.array(Image(output))
+    return output[border:output.shape[0]-border, border:output.shape[1]-border]/scale, dt
+
+def cases(im):
+    '''(name, run, expected, tolerance) for every schedule, where run() returns the output
+    and its time. tolerance is the maximum absolute difference with expected, or for the
+    binary Harris masks the fraction of pixels allowed to differ (ties of R in float32)'''
+    green=numpy.ascontiguousarray(im[:, :, 1])
+    box5=reference.box5x5(im)
+    box3=reference.box3x3(green)
+    corners=reference.harris(im)
+    L=[('boxBlur %d' % i, lambda i=i: boxBlurCase(im, i), box5, 1e-5) for i in xrange(7)]
+    L+=[('computeHarris %d' % i, lambda i=i: harrisCase(im, i), corners, 1e-4) for i in xrange(3)]
+    L+=[('tutorial6 %d' % i, lambda i=i: tutorial6_3x3box_schedule.boxSchedule(green, i), box3, 1e-5)
+        for i in xrange(1, 5)]
+    # the running sums accumulate in float32 along whole rows and columns
+    L+=[('runningBoxBlur %d' % w, lambda w=w: runningCase(im, w), reference.boxBlur(im, w), 1e-4)
+        for w in [3, 5, 9, 17]]
+    # every image of a batch of mixed sizes against its own realize
+    crops=mixedCrops(im)
+    single=flattened([boxBlurCase(c, 0)[0] for c in crops])
+    L+=[('batchedBoxBlur %d' % i, lambda i=i: batchCase(crops, i), single, 1e-5)
+        for i in xrange(2)]
+    L+=[('batchedHarris', lambda: harrisBatchCase(crops),
+         flattened([reference.harris(c) for c in crops]), 1e-4)]
+    # interior without boundary conditions and border strips narrower than a tile
+    L+=[('realizeSplit %s' % name, lambda name=name: splitCase(im, name), clampedPrefix(im, name), 1e-5)
+        for name in ['blurredLumi', 'R', 'Harris']]
+    # the boxes are clipped to the image near the borders
+    L+=[('box_mean %d' % r, lambda r=r: boxMeanCase(im, r), reference.boxMean(im, r), 1e-5)
+        for r in [1, 5, 50]]
+    # the bit-packed mask of harrisCorners has a partial last byte: 509 is not a multiple of 8
+    odd=deterministicImage(509, 381)
+    R=reference.harrisResponse(odd)
+    L+=[('Harris corners', lambda: cornerMaskCase(odd), reference.harris(odd), 1e-4)]
+    # R is at most about 6e-5 on this image
+    L+=[('corner responses', lambda: cornerResponseCase(odd, R), R, 1e-8)]
+    # the float32 partial sums are good to about 1e-6 of the sum
+    total=reference.channelSum(odd)
+    L+=[('parallel_sum', lambda: reductionCase(odd, 'parallel_sum', total), numpy.ones_like(total), 1e-6),
+        ('parallel_mean', lambda: reductionCase(odd, 'parallel_mean'), reference.channelMean(odd), 1e-6),
+        ('histogram', lambda: reductionCase(odd, 'histogram'), reference.histogram(odd[:, :, 1]), 0)]
+    # the recursive Gaussian, only used by Harris for sigma>=harris.iirSigma
+    lumi=reference.luminance(im)
+    for sigma in [harris.iirSigma, 2*harris.iirSigma]:
+        L+=[('gaussian iir %g' % sigma, lambda sigma=sigma: gaussianCase(im, sigma, 'iir'),
+             reference.gaussianIIR(lumi, sigma), 1e-4)]
+        # against the direct convolution, relative to the maximum of the blur. The edges
+        # are handled differently, and the truncated kernel of the direct convolution is
+        # centered half a pixel off: they agree within 4%, 2.6% at sigma 3
+        fir=reference.gaussian(lumi, sigma, method='fir')
+        border, scale = int(3*sigma)+1, numpy.max(numpy.abs(fir))
+        L+=[('gaussian iir/fir %g' % sigma,
+             lambda sigma=sigma, border=border, scale=scale: gaussianCase(im, sigma, 'iir', border, scale),
+             fir[border:-border, border:-border]/scale, 0.04)]
+    return L
+
+def compare(output, expected, tolerance, binary):
+    '''error of output with respect to expected, and whether it is within tolerance'''
+    if output.shape!=expected.shape:
+        return numpy.inf, False
+    if binary:
+        error=numpy.mean(output!=expected)
+    else:
+        error=numpy.max(numpy.abs(output-expected))
+    return error, error<=tolerance
+
+def baselinePath():
+    return os.path.join('baselines', socket.gethostname()+'.json')
+
+def loadBaseline(path):
+    if not os.path.exists(path): return {}
+    f=open(path)
+    baseline=json.load(f)
+    f.close()
+    return baseline
+
+def saveBaseline(path, baseline):
+    if not os.path.exists(os.path.dirname(path)): os.makedirs(os.path.dirname(path))
+    f=open(path, 'w')
+    json.dump(baseline, f, indent=1, sort_keys=True)
+    f.close()
+
+def main():
+    update='update' in sys.argv
+    numbers=[a for a in sys.argv[1:] if a!='update']
+    tolerance=float(numbers[0]) if numbers else 25.0
+
+    im=deterministicImage()
+    mpix=im.shape[0]*im.shape[1]/1e6
+    path=baselinePath()
+    baseline=loadBaseline(path)
+    failures=[]
+    results=[]
+    # the baseline file is only written on update or when a case gets its first baseline
+    changed=update
+
+    for name, run, expected, maxError in cases(im):
+        output, dt = run()
+        error, ok = compare(output, expected, maxError, 'Harris' in name)
+        msPerMpix=dt/mpix*1e3
+        if not ok: failures.append(name+': wrong output')
+        status='ok' if ok else 'WRONG'
+        if name in baseline and not update:
+            slowdown=100.0*(msPerMpix/baseline[name]-1)
+            if slowdown>tolerance:
+                failures.append(name+': %.1f%% slower than its baseline' % slowdown)
+                status+=', SLOWER'
+        else:
+            changed=changed or name not in baseline
+            baseline[name]=msPerMpix
+        results.append((name, error, msPerMpix, baseline[name], status))
+
+    print '\n%-24s %12s %12s %12s  %s' % ('schedule', 'error', 'ms/Mpix', 'baseline', 'status')
+    for name, error, msPerMpix, base, status in results:
+        print '%-24s %12.3g %12.4f %12.4f  %s' % (name, error, msPerMpix, base, status)
+    if changed: saveBaseline(path, baseline)
+
+    if failures:
+        print '\n', len(failures), 'failures:'
+        for f in failures: print '   ', f
+        sys.exit(1)
+    print '\n all', len(results), 'schedules passed'
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
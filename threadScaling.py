@@ -0,0 +1,102 @@
+# Thread scaling of the schedules.
+
+# tutorial6 schedule 4, tutorial10 schedules 3, 5 and 6 and the parallel scans use
+# .parallel(), but the number of threads is whatever the Halide runtime picks: one per
+# core. The runtime reads HL_NUM_THREADS once, when it starts its thread pool, so every
+# thread count is measured in a fresh python process. For each schedule we report the
+# speedup T(1)/T(n), the parallel efficiency speedup/n and the serial fraction s of
+# Amdahl's law T(n) = T(1)*(s + (1-s)/n), fitted by least squares on all the counts.
+#
+#   python threadScaling.py                 every schedule, 1, 2, 4... threads up to the cores
+#   python threadScaling.py tutorial10      only the schedules whose name starts with tutorial10
+
+import os, sys
+import subprocess
+import json
+import multiprocessing
+import numpy
+
+def schedules():
+    '''names of the schedules that can be measured, see runSchedule'''
+    return (['tutorial6 %d' % i for i in xrange(1, 5)]+
+            ['tutorial10 %d' % i for i in xrange(7)]+
+            ['harris %d' % i for i in xrange(3)])
+
+def runSchedule(name):
+    '''realize the schedule name in this process, return the time of a realize'''
+    import synthetic
+    im=synthetic.benchmarkImage()
+    module, i = name.split()
+    i=int(i)
+    if module=='tutorial6':
+        import tutorial6_3x3box_schedule
+        output, dt = tutorial6_3x3box_schedule.boxSchedule(numpy.ascontiguousarray(im[:, :, 1]), i)
+        return dt
+    if module=='tutorial10':
+        import tutorial10_convolutionSchedule
+        output, dt = tutorial10_convolutionSchedule.boxBlur(im, i, 256, 256)
+        return dt/5
+    import harris
+    # best of 3, the first realize includes some of the runtime start up
+    return min(harris.computeHarris(im, i)[1] for r in xrange(3))
+
+def threadCounts(cores=None):
+    '''1, 2, 4... up to the number of cores, which is always included'''
+    if cores is None: cores=multiprocessing.cpu_count()
+    counts, n = [], 1
+    while n<cores:
+        counts.append(n)
+        n*=2
+    return counts+[cores]
+
+def measure(name, threads):
+    '''time of the schedule name with HL_NUM_THREADS=threads, in a child process'''
+    env=dict(os.environ)
+    env['HL_NUM_THREADS']=str(threads)
+    # older runtimes read HL_NUMTHREADS
+    env['HL_NUMTHREADS']=str(threads)
+    out=subprocess.check_output([sys.executable, __file__, 'child', name], env=env)
+    # the tutorials print their own progress, the time is the last line
+    return json.loads(out.strip().splitlines()[-1])['time']
+
+def amdahl(counts, times):
+    '''serial fraction s and single thread time T1 of the least squares fit of
+    T(n) = T1*s + T1*(1-s)/n, which is linear in 1/n'''
+    A=numpy.array([[1.0, 1.0/n] for n in counts])
+    (a, b), residuals, rank, sv = numpy.linalg.lstsq(A, numpy.array(times), rcond=None)
+    s=a/(a+b) if a+b>0 else 1.0
+    return min(max(s, 0.0), 1.0), a+b
+
+def scaling(names=None, counts=None):
+    '''measure every schedule at every thread count.
+    Returns a dict mapping names to (counts, times, serial fraction)'''
+    if names is None: names=schedules()
+    if counts is None: counts=threadCounts()
+    results={}
+    for name in names:
+        times=[measure(name, n) for n in counts]
+        s, T1 = amdahl(counts, times)
+        results[name]=(counts, times, s)
+        print '\n', name, ', serial fraction %.3f' % s
+        print '%8s %10s %8s %10s' % ('threads', 'seconds', 'speedup', 'efficiency')
+        for n, t in zip(counts, times):
+            speedup=times[0]/t
+            print '%8d %10.4f %8.2f %10.2f' % (n, t, speedup, speedup/n)
+    return results
+
+def main():
+    if len(sys.argv)>2 and sys.argv[1]=='child':
+        print json.dumps({'time': runSchedule(' '.join(sys.argv[2:]))})
+        return
+    names=schedules()
+    if len(sys.argv)>1:
+        names=[n for n in names if n.startswith(sys.argv[1])]
+    results=scaling(names)
+    print '\n%-14s %8s %12s' % ('schedule', 'serial', 'max speedup')
+    for name in names:
+        counts, times, s = results[name]
+        print '%-14s %8.3f %12.2f' % (name, s, times[0]/min(times))
+
+#usual python business to declare main function in module.
+if __name__ == '__main__':
+    main()
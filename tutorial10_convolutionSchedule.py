@@ -7,14 +7,15 @@ import os, sys
 from halide import *
 import time
 import numpy
+import synthetic
 
 #Python Imaging Library will be used for IO
 import imageIO
+import reference
 
-def boxBlur(im, indexOfSchedule, tileX=128, tileY=128):
-
-    kernel_width=5
-    input = Image(Float(32), im)
+def boxBlurFunc(input, indexOfSchedule, tileX=128, tileY=128, kernel_width=5):
+    '''box blur of the Halide Image (or ImageParam) input with one of the schedules below.
+    Returns the blur Func'''
 
     x, y, c = Var('x'), Var('y'), Var('c') #declare domain variables
 
@@ -83,6 +84,12 @@ def boxBlur(im, indexOfSchedule, tileX=128, tileY=128):
         blur.tile(x, y, xo, yo, xi, yi, tileX, tileY).parallel(yo).vectorize(xi, vectorWidth)
         clampedBlurx.compute_root().tile(x, y, xo, yo, xi, yi, tileX, tileY).parallel(yo).vectorize(xi, vectorWidth)
 
+    return blur
+
+def boxBlur(im, indexOfSchedule, tileX=128, tileY=128, kernel_width=5):
+
+    input = Image(Float(32), im)
+    blur = boxBlurFunc(input, indexOfSchedule, tileX, tileY, kernel_width)
 
     blur.compile_jit()
     t=time.time()
@@ -94,9 +101,112 @@ def boxBlur(im, indexOfSchedule, tileX=128, tileY=128):
 
     return output, dt
 
+def runningBoxBlurFunc(input, radius):
+    '''box blur of width 2*radius+1 of the Halide Image input, where radius can be a Param.
+    Each output of a running sum adds the sample entering the window and subtracts the 
+    one leaving it, so the cost per pixel does not depend on the width.
+    The running sums are scans along complete rows (columns) and are computed at root, 
+    in parallel over blocks of rows (columns) and vectorized across 8 rows (columns).
+    Returns the blur Func'''
+
+    x, y, c = Var('x'), Var('y'), Var('c')
+    xo, xi, yo, yi = Var('xo'), Var('xi'), Var('yo'), Var('yi')
+    width, height = input.width(), input.height()
+
+    clamped = Func('clamped') 
+    clamped[x, y, c] = input[clamp(x, 0, width-1),
+                             clamp(y, 0, height-1), c]
+
+    # sum of the first window of each row
+    rw = RDom(0, 2*radius+1, 'rw')
+    firstx = Func('firstWindow_x')
+    firstx[y,c] = 0.0
+    firstx[y,c] += clamped[rw.x-radius, y, c]
+
+    # running sum along x
+    sum_x = Func('sum_x')
+    rx = RDom(1, width-1, 'rx')
+    sum_x[x,y,c] = firstx[y,c]
+    sum_x[rx.x,y,c] = sum_x[rx.x-1,y,c] + clamped[rx.x+radius,y,c] - clamped[rx.x-radius-1,y,c]
+
+    clampedSumx = Func('clampedSumx') 
+    clampedSumx[x, y, c] = sum_x[x, clamp(y, 0, height-1), c]
+
+    # same thing along y
+    firsty = Func('firstWindow_y')
+    firsty[x,c] = 0.0
+    firsty[x,c] += clampedSumx[x, rw.x-radius, c]
+
+    sum_y = Func('sum_y')
+    ry = RDom(1, height-1, 'ry')
+    sum_y[x,y,c] = firsty[x,c]
+    sum_y[x,ry.x,c] = sum_y[x,ry.x-1,c] + clampedSumx[x,ry.x+radius,c] - clampedSumx[x,ry.x-radius-1,c]
+
+    blur = Func('runningBlur')
+    blur[x,y,c] = sum_y[x,y,c]/((2*radius+1)**2)
+
+    # schedule: rows are independent, so the horizontal scan runs in parallel over 
+    # blocks of 8 rows and each step is a vector of 8 rows. Same for the columns.
+    firstx.compute_root().parallel(y)
+    sum_x.compute_root()
+    sum_x.update().split(y, yo, yi, 8).reorder(yi, rx.x, yo).vectorize(yi).parallel(yo)
+    firsty.compute_root().vectorize(x, 8)
+    sum_y.compute_root()
+    sum_y.update().split(x, xo, xi, 8).reorder(xi, ry.x, xo).vectorize(xi).parallel(xo)
+    blur.parallel(y).vectorize(x, 8)
+
+    return blur
+
+def runningBoxBlur(im, kernel_width=5):
+    '''running-sum box blur of odd width kernel_width, see runningBoxBlurFunc.
+    The width is a runtime parameter: the pipeline is compiled once per call 
+    regardless of the width. Returns output, dt like boxBlur'''
+    input = Image(Float(32), im)
+    radius = Param(Int(32), 'radius')
+    blur = runningBoxBlurFunc(input, radius)
+    blur.compile_jit()
+    return runRunningBoxBlur(blur, radius, input, kernel_width)
+
+def runRunningBoxBlur(blur, radius, input, kernel_width, numTimes=5):
+    '''realize an already compiled running box blur for a given width, which must be odd'''
+    if kernel_width%2==0:
+        # the window is 2*radius+1 wide, an even width would silently become width+1
+        raise ValueError('the running box blur needs an odd width, not %d' % kernel_width)
+    print '\n', 'running sum, width ', kernel_width
+    radius.set(kernel_width/2)
+    t=time.time()
+    for i in xrange(numTimes):
+        output = blur.realize(input.width(), input.height(), input.channels())
+    dt=time.time()-t
+    print '           took ', dt/numTimes, 'seconds'
+    return output, dt
+
+def benchmarkWidths(im, widths=[3, 5, 9, 17, 33, 65, 101], tile=256):
+    '''compare the seven schedules of boxBlur with the running sum for several kernel widths. 
+    The running sum is compiled once for all widths.
+    Returns a dict mapping (schedule, width) to the time per realize, where schedule is 
+    0 to 6, 'running' or 'numpy' (the CPU baseline of reference.boxBlur) '''
+    times={}
+    input = Image(Float(32), im)
+    radius = Param(Int(32), 'radius')
+    running = runningBoxBlurFunc(input, radius)
+    running.compile_jit()
+    for w in widths:
+        for i in xrange(7):
+            output, dt=boxBlur(im, i, tile, tile, w)
+            times[(i, w)]=dt/5
+        output, dt=runRunningBoxBlur(running, radius, input, w)
+        times[('running', w)]=dt/5
+        output, times[('numpy', w)]=reference.run(reference.boxBlur, (im, w), 1)
+
+    print '\n width ', ' '.join('%9s' % ('sched %d' % i) for i in xrange(7)), '  running     numpy'
+    for w in widths:
+        print '%6d ' % w, ' '.join('%9.4f' % times[(i, w)] for i in xrange(7)), '%9.4f' % times[('running', w)], '%9.4f' % times[('numpy', w)]
+    return times
+
 def main():    
     #im=imageIO.imread('hk.png')
-    im=numpy.load('Input/hk.npy')
+    im=synthetic.benchmarkImage()
     output=None
     for i in xrange(7):
         if i<2:
@@ -105,6 +215,10 @@ def main():
             for tileY in [256]: 
                 for tileX in [256]: 
                     output, dt=boxBlur(im, i, tileX, tileY)
+
+    # python tutorial10_convolutionSchedule.py widths
+    if 'widths' in sys.argv:
+        benchmarkWidths(im)
     
     #outputNP=numpy.array(Image(output))
     #imageIO.imwrite(outputNP)
@@ -21,6 +21,11 @@ import time
 import numpy
 
 def runAndMeasure(myFunc, w, h, nTimes=5):
+    output, best = realizeAndMeasure(myFunc, w, h, nTimes)
+    return best
+
+def realizeAndMeasure(myFunc, w, h, nTimes=5):
+    '''runAndMeasure that also returns the output of the last realize'''
     L=[]
     output=None
     myFunc.compile_jit()    
@@ -33,7 +38,34 @@ def runAndMeasure(myFunc, w, h, nTimes=5):
     mpix=hIm.width()*hIm.height()/1e6
     print 'best: ', numpy.min(L), 'average: ', numpy.mean(L)
     print  '%.5f ms per megapixel (%.7f ms for %d megapixels)' % (numpy.mean(L)/mpix*1e3, numpy.mean(L)*1e3, mpix)
-    return numpy.min(L)        
+    return output, numpy.min(L)
+
+def boxSchedule(inputP, indexOfSchedule, tileX=256, tileY=32):
+    '''the 3x3 box blur of main on the single-channel numpy image inputP with its
+    schedule 1 (ROOT), 2 (INLINE), 3 (TILING) or 4 (TILE & PARALLEL).
+    Returns the numpy output, two pixels smaller than the input, and the best time'''
+    input=Image(Float(32), inputP)
+    x, y = Var('x'), Var('y')
+    xo, yo, xi, yi = Var('xo'), Var('yo'), Var('xi'), Var('yi')
+    blur_x, blur_y = Func('blur_x'), Func('blur_y')
+    blur_x[x,y] = (input[x,y]+input[x+1,y]+input[x+2,y])/3
+    blur_y[x,y] = (blur_x[x,y]+blur_x[x,y+1]+blur_x[x,y+2])/3
+
+    if indexOfSchedule==1:
+        blur_y.compute_root()
+        blur_x.compute_root()
+    if indexOfSchedule==2:
+        blur_y.compute_root()
+        blur_x.compute_inline()
+    if indexOfSchedule==3:
+        blur_y.tile(x, y, xo, yo, xi, yi, tileX, tileY)
+        blur_x.compute_at(blur_y, xo)
+    if indexOfSchedule==4:
+        blur_y.tile(x, y, xo, yo, xi, yi, tileX, tileY).parallel(yo).vectorize(xi, 8)
+        blur_x.compute_at(blur_y, xo).vectorize(x, 8)
+
+    output, dt = realizeAndMeasure(blur_y, input.width()-2, input.height()-2)
+    return numpy.array(Image(output)), dt
 
 def main():
     #load the input, convert to single channel and turn into Halide Image